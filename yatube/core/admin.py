@@ -0,0 +1,64 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from . import profiling
+from .models import ProfileCapture
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = (
+        'created', 'method', 'path', 'view', 'duration_ms', 'samples',
+        'download'
+    )
+    list_filter = ('view',)
+    search_fields = ('path',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_queryset(self, request, queryset):
+        for capture in queryset:
+            capture.delete()
+
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('admin:core_profilecapture_download', args=[obj.pk]),
+            obj.file
+        )
+    download.short_description = 'Стеки'
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_profilecapture_download'
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        """Файл collapsed для flamegraph.pl или speedscope."""
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        if not capture.full_path.is_file():
+            raise Http404
+        return FileResponse(
+            capture.full_path.open('rb'), as_attachment=True,
+            filename=capture.file, content_type='text/plain; charset=utf-8'
+        )
+
+    def changelist_view(self, request, extra_context=None):
+        """Подсказывает staff, как снять профиль своего запроса."""
+        self.message_user(
+            request,
+            f'Чтобы снять профиль запроса, добавьте к адресу '
+            f'?{profiling.PARAM}={profiling.token()}'
+        )
+        return super().changelist_view(request, extra_context)
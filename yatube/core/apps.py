@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import metrics
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
+        if settings.METRICS_ENABLED:
+            metrics.install()
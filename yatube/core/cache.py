@@ -0,0 +1,288 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: только замок процесса
+    fcntl = None
+
+SEQUENCE_KEY = 'tiered:sequence'
+SEQUENCE_LOCK = 'tiered-sequence.lock'
+MESSAGE_KEY = 'tiered:message:{}'
+_MISSING = object()
+LOCK_KEY = 'lock:{}'
+LOCK_TIMEOUT = 10
+LOCK_POLL = 0.01
+_process_locks = {}
+
+
+@contextmanager
+def _file_lock(backend, name):
+    """flock на файле name в каталоге файлового кеша."""
+    with _process_locks.setdefault(name, threading.Lock()):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(backend._dir, exist_ok=True)
+        fd = os.open(
+            os.path.join(backend._dir, name), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+@contextmanager
+def sequence_lock(l2):
+    """Замок выдачи номеров сообщений.
+
+    incr файлового кеша — это get и set, и два процесса получили бы
+    один номер. Для него номер выдаётся под файловым замком в каталоге
+    кеша; L2 с атомарным incr (memcached, redis) замок не нужен.
+    """
+    if not isinstance(l2, FileBasedCache):
+        yield
+        return
+    with _file_lock(l2, SEQUENCE_LOCK):
+        yield
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кеш: LRU в памяти процесса перед общим кешем.
+
+    L2 — другой алиас из settings.CACHES (файловый, memcached, redis);
+    номера сообщений выдаются атомарно, см. sequence_lock.
+    Каждая запись публикует в L2 сообщение об инвалидации; процессы
+    читают журнал сообщений не чаще POLL_INTERVAL секунд и выбрасывают
+    изменённые ключи из своего L1. Если журнал потерян или процесс
+    отстал больше чем на LOG_SIZE сообщений, L1 очищается целиком.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self._max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._poll_interval = options.get('POLL_INTERVAL', 1.0)
+        self._log_size = options.get('LOG_SIZE', 10000)
+        self._worker = uuid.uuid4().hex
+        self._l1 = OrderedDict()
+        self._lock = threading.RLock()
+        self._seen = None
+        self._polled_at = 0.0
+        self.stats = Counter()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def metrics(self):
+        """Попадания и промахи по уровням и размер L1."""
+        with self._lock:
+            return dict(self.stats, l1_entries=len(self._l1))
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            expires, data = entry
+            if expires < time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self._l1_timeout
+        if timeout is not None and timeout is not DEFAULT_TIMEOUT:
+            ttl = min(ttl, timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, data)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+                self.stats['l1_evictions'] += 1
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _publish(self, *keys):
+        """Сообщает остальным процессам об изменённых ключах."""
+        l2 = self.l2
+        for key in keys:
+            sequence = self._next_sequence(l2)
+            l2.set(MESSAGE_KEY.format(sequence), (self._worker, key), None)
+            l2.delete(MESSAGE_KEY.format(sequence - self._log_size))
+
+    def _next_sequence(self, l2):
+        with sequence_lock(l2):
+            try:
+                return l2.incr(SEQUENCE_KEY)
+            except ValueError:
+                l2.add(SEQUENCE_KEY, 0, None)
+                return l2.incr(SEQUENCE_KEY)
+
+    def _poll(self):
+        now = time.monotonic()
+        if now - self._polled_at < self._poll_interval:
+            return
+        self._polled_at = now
+        l2 = self.l2
+        current = l2.get(SEQUENCE_KEY, 0)
+        seen, self._seen = self._seen, current
+        if seen is None or current == seen:
+            return
+        if current < seen or current - seen > self._log_size:
+            self._clear_l1()
+            return
+        messages = l2.get_many(
+            [MESSAGE_KEY.format(n) for n in range(seen + 1, current + 1)]
+        )
+        if len(messages) < current - seen:
+            self._clear_l1()
+            return
+        self.stats['invalidations'] += len(messages)
+        for worker, key in messages.values():
+            if worker != self._worker:
+                self._l1_delete(key)
+
+    def _clear_l1(self):
+        with self._lock:
+            self._l1.clear()
+        self.stats['l1_flushes'] += 1
+
+    def get(self, key, default=None, version=None):
+        self._poll()
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        value = self._l1_get(full_key)
+        if value is not _MISSING:
+            self.stats['l1_hits'] += 1
+            return value
+        self.stats['l1_misses'] += 1
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.stats['l2_misses'] += 1
+            return default
+        self.stats['l2_hits'] += 1
+        self._l1_set(full_key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._poll()
+        found = {}
+        remote = []
+        for key in keys:
+            full_key = self.make_key(key, version)
+            value = self._l1_get(full_key)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        self.stats['l1_hits'] += len(found)
+        self.stats['l1_misses'] += len(remote)
+        if remote:
+            fetched = self.l2.get_many(remote, version=version)
+            self.stats['l2_hits'] += len(fetched)
+            self.stats['l2_misses'] += len(remote) - len(fetched)
+            for key, value in fetched.items():
+                self._l1_set(self.make_key(key, version), value, None)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(full_key, value, timeout)
+        self._publish(full_key)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        keys = []
+        for key, value in data.items():
+            if key in failed:
+                continue
+            full_key = self.make_key(key, version)
+            self._l1_set(full_key, value, timeout)
+            keys.append(full_key)
+        self._publish(*keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        if not self.l2.add(key, value, timeout, version=version):
+            return False
+        self._l1_set(full_key, value, timeout)
+        self._publish(full_key)
+        return True
+
+    def delete(self, key, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self.l2.delete(key, version=version)
+        self._l1_delete(full_key)
+        self._publish(full_key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        full_key = self.make_key(key, version)
+        value = self.l2.incr(key, delta, version=version)
+        self._l1_delete(full_key)
+        self._publish(full_key)
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self.l2.clear()
+        self._clear_l1()
+        self._seen = None
+
+
+@contextmanager
+def locked(name, alias='default'):
+    """Замок для чтения-изменения-записи ключей общего кеша.
+
+    Отдаёт кеш, из которого читать под замком: у TieredCache это L2,
+    потому что L1 процесса может ещё не знать о чужой записи. Писать
+    нужно через обычный кеш, чтобы остальные процессы сбросили L1.
+    На файловом кеше замок — flock в его каталоге, на остальных — add
+    ключа, который истекает через LOCK_TIMEOUT секунд.
+    """
+    backend = caches[alias]
+    if isinstance(backend, TieredCache):
+        backend = backend.l2
+    if isinstance(backend, FileBasedCache):
+        with _file_lock(backend, f'{name}.lock'):
+            yield backend
+        return
+    key = LOCK_KEY.format(name)
+    token = uuid.uuid4().hex
+    while not backend.add(key, token, LOCK_TIMEOUT):
+        time.sleep(LOCK_POLL)
+    try:
+        yield backend
+    finally:
+        if backend.get(key) == token:
+            backend.delete(key)
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import routers
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONCURRENT_QUERY_WORKERS,
+                thread_name_prefix='queries'
+            )
+    return _executor
+
+
+class Done:
+    """Уже вычисленный результат с интерфейсом Future."""
+
+    def __init__(self, func, args, kwargs):
+        self._error = None
+        try:
+            self._value = func(*args, **kwargs)
+        except Exception as error:
+            self._error = error
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def _wrappers():
+    """Обёртки execute_wrapper соединений потока запроса: метрики,
+    журнал запросов и бюджет запросов."""
+    return {
+        connection.alias: list(connection.execute_wrappers)
+        for connection in connections.all()
+    }
+
+
+def _run(routing, wrappers, func, args, kwargs):
+    try:
+        with routers.restored(routing), ExitStack() as stack:
+            for alias, funcs in wrappers.items():
+                for wrapper in funcs:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(wrapper)
+                    )
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def defer(func, *args, **kwargs):
+    """Запускает независимый запрос параллельно с потоком запроса.
+
+    Возвращает объект с методом result(), который ждёт окончания
+    и пробрасывает исключение. Каждый поток пула работает со своим
+    соединением с БД, поэтому запросы идут одновременно. При
+    CONCURRENT_QUERY_WORKERS = 0 функция выполняется сразу. Поток
+    пула читает из той же БД, что и поток запроса (core.routers), и
+    его запросы проходят через те же execute_wrapper: их видят
+    метрики, журнал запросов и query_budget.
+    """
+    if not settings.CONCURRENT_QUERY_WORKERS:
+        return Done(func, args, kwargs)
+    return _pool().submit(
+        _run, routers.snapshot(), _wrappers(), func, args, kwargs
+    )
@@ -0,0 +1,90 @@
+import time
+from contextlib import ExitStack
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+
+from . import routers
+from .sqlite import write_queue
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+
+def read_replica(view):
+    """Чтения представления идут на реплику (core.routers)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with routers.replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def serialize_writes(view=None, *, all_methods=False):
+    """Пишущие запросы выполняются по одному и повторяются при
+    «database is locked».
+
+    Запрос идёт в транзакции под core.sqlite.write_queue(), поэтому
+    писатели не соревнуются за блокировку SQLite, а неудачная попытка
+    откатывается целиком. Включается настройкой SQLITE_SERIALIZE_WRITES.
+    Безопасные методы идут мимо очереди, кроме представлений с
+    all_methods=True, которые пишут и на GET.
+    """
+    if view is None:
+        return partial(serialize_writes, all_methods=all_methods)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.SQLITE_SERIALIZE_WRITES
+                or (request.method in SAFE_METHODS and not all_methods)
+                or connection.vendor != 'sqlite'):
+            return view(request, *args, **kwargs)
+        retries = settings.SQLITE_WRITE_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                with write_queue(), transaction.atomic():
+                    return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if 'locked' not in str(error) or attempt == retries:
+                    raise
+            time.sleep(0.05 * 2 ** attempt)
+    return wrapper
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше запросов, чем ему отведено."""
+
+
+def query_budget(limit):
+    """Ограничивает число SQL-запросов представления.
+
+    Проверка включается настройкой QUERY_BUDGET_CHECKS (в тестах),
+    в обычном режиме декоратор ничего не делает. Запросы считаются
+    обёрткой execute_wrapper, поэтому учитываются и потоки
+    core.concurrency.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.QUERY_BUDGET_CHECKS:
+                return view(request, *args, **kwargs)
+            queries = []
+
+            def record(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with ExitStack() as stack:
+                for db in connections.all():
+                    stack.enter_context(db.execute_wrapper(record))
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+            if len(queries) > limit:
+                raise QueryBudgetExceeded(
+                    f'{view.__name__}: {len(queries)} запросов при '
+                    f'бюджете {limit}:\n' + '\n'.join(queries)
+                )
+            return response
+        return wrapper
+    return decorator
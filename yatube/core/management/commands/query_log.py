@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def read_entries(path):
+    """Записи журнала и его ротированных копий, от старых к новым."""
+    path = Path(path)
+    files = sorted(
+        path.parent.glob(path.name + '.*'),
+        key=lambda file: int(file.suffix[1:]) if file.suffix[1:].isdigit()
+        else 0, reverse=True
+    )
+    for file in files + [path]:
+        if not file.is_file():
+            continue
+        with file.open(encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных и повторяющихся запросов '
+            '(settings.QUERY_LOG_FILE): какие запросы, откуда и сколько.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=('slow', 'duplicate'))
+        parser.add_argument('--view', help='Только это представление.')
+        parser.add_argument(
+            '--since', help='Только записи не раньше (ISO 8601).'
+        )
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--file', default=settings.QUERY_LOG_FILE)
+
+    def collect(self, options):
+        """Записи, сгруппированные по виду, представлению и запросу."""
+        groups = {}
+        for entry in read_entries(options['file']):
+            if options['kind'] and entry.get('kind') != options['kind']:
+                continue
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            if options['since'] and entry.get('at', '') < options['since']:
+                continue
+            key = (entry.get('kind'), entry.get('view'), entry.get('sql'))
+            group = groups.setdefault(key, {
+                'hits': 0, 'ms': 0.0, 'max_ms': 0.0, 'queries': 0,
+                'template': None, 'code': None,
+            })
+            group['hits'] += 1
+            group['ms'] += entry.get('ms', 0)
+            group['max_ms'] = max(group['max_ms'], entry.get('ms', 0))
+            group['queries'] += entry.get('count', 1)
+            group['template'] = entry.get('template') or group['template']
+            group['code'] = entry.get('code') or group['code']
+        return groups
+
+    def handle(self, *args, **options):
+        if not options['file']:
+            raise CommandError('Журнал не задан: YATUBE_QUERY_LOG или --file')
+        groups = self.collect(options)
+        if not groups:
+            self.stdout.write('Записей нет')
+            return
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['ms'], reverse=True
+        )
+        for (kind, view, sql), group in ranked[:options['top']]:
+            self.stdout.write(
+                f'{kind:9} {view}  раз: {group["hits"]}, '
+                f'запросов: {group["queries"]}, '
+                f'всего {group["ms"]:.1f} мс, макс. {group["max_ms"]:.1f} мс'
+            )
+            for place in (group['template'], group['code']):
+                if place:
+                    self.stdout.write(f'          {place}')
+            self.stdout.write(f'          {sql[:300]}')
@@ -0,0 +1,297 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.module_loading import import_string
+
+# Метрика -> (описание, границы корзин гистограммы)
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Время ответа представления',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    ),
+    'sql_queries': (
+        'SQL-запросов на запрос',
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    'sql_duration_seconds': (
+        'Суммарное время SQL на запрос',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    ),
+    'template_duration_seconds': (
+        'Время отрисовки шаблонов на запрос',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    ),
+    'cache_hits': ('Попаданий в кеш на запрос', (0, 1, 2, 5, 10, 50)),
+    'cache_misses': ('Промахов кеша на запрос', (0, 1, 2, 5, 10, 50)),
+    'response_size_bytes': (
+        'Размер ответа',
+        (1024, 4096, 16384, 65536, 262144, 1048576),
+    ),
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_series = {}
+_MISSING = object()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; их пополняют обёртки курсора,
+    шаблонов и кеша в потоке запроса и в потоках core.concurrency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.sql += elapsed
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        total = time.perf_counter() - self.started
+        return ', '.join((
+            f'sql;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} '
+            f'misses={self.cache_misses}"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def observe(self, view, size):
+        """Кладёт итоги запроса в гистограммы представления."""
+        values = {
+            'request_duration_seconds': time.perf_counter() - self.started,
+            'sql_queries': self.queries,
+            'sql_duration_seconds': self.sql,
+            'template_duration_seconds': self.template,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+        if size is not None:
+            values['response_size_bytes'] = size
+        for name, value in values.items():
+            histogram(name, view).observe(value)
+
+
+class RollingHistogram:
+    """Гистограмма за последние window секунд.
+
+    Окно поделено на slots интервалов; устаревший интервал
+    обнуляется, когда в него снова попадает наблюдение.
+    """
+
+    def __init__(self, buckets, window, slots):
+        self.buckets = buckets
+        self.width = window / slots
+        self.slots = [None] * slots
+        self.lock = threading.Lock()
+
+    def _slot(self, now):
+        tick = int(now // self.width)
+        index = tick % len(self.slots)
+        slot = self.slots[index]
+        if slot is None or slot[0] != tick:
+            slot = self.slots[index] = [tick, [0] * len(self.buckets), 0, 0]
+        return slot
+
+    def observe(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            _, counts, _, _ = slot = self._slot(now)
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            slot[2] += value
+            slot[3] += 1
+
+    def snapshot(self, now=None):
+        """(накопленные счётчики корзин, сумма, число наблюдений)."""
+        now = time.monotonic() if now is None else now
+        oldest = int(now // self.width) - len(self.slots) + 1
+        counts = [0] * len(self.buckets)
+        total = 0
+        observed = 0
+        with self.lock:
+            for slot in self.slots:
+                if slot is None or slot[0] < oldest:
+                    continue
+                for index, value in enumerate(slot[1]):
+                    counts[index] += value
+                total += slot[2]
+                observed += slot[3]
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, observed
+
+
+def histogram(name, view):
+    key = (name, view)
+    with _lock:
+        if key not in _series:
+            _series[key] = RollingHistogram(
+                HISTOGRAMS[name][1], settings.METRICS_WINDOW,
+                settings.METRICS_WINDOW_SLOTS
+            )
+        return _series[key]
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def measure(metrics=None):
+    """Собирает метрики запроса, пока открыт контекст; metrics —
+    продолжить уже начатые (для потоковых ответов)."""
+    metrics = metrics or RequestMetrics()
+    _local.metrics = metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute)
+                )
+            yield metrics
+    finally:
+        _local.metrics = None
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus(extra=None):
+    """Гистограммы в текстовом формате Prometheus.
+
+    extra — словарь {имя: (описание, {метка: значение})} с
+    дополнительными датчиками, например статистикой кеша.
+    """
+    with _lock:
+        series = sorted(_series.items())
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        metric = f'yatube_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (series_name, view), rolling in series:
+            if series_name != name:
+                continue
+            counts, total, observed = rolling.snapshot()
+            view = _label(view)
+            for bound, count in zip(buckets, counts):
+                lines.append(
+                    f'{metric}_bucket{{view="{view}",'
+                    f'le="{_number(bound)}"}} {count}'
+                )
+            lines.append(
+                f'{metric}_bucket{{view="{view}",le="+Inf"}} {observed}'
+            )
+            lines.append(f'{metric}_sum{{view="{view}"}} {_number(total)}')
+            lines.append(f'{metric}_count{{view="{view}"}} {observed}')
+    for name, (description, values) in (extra or {}).items():
+        metric = f'yatube_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} gauge')
+        for label, value in sorted(values.items()):
+            lines.append(
+                f'{metric}{{stat="{_label(label)}"}} {_number(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = current()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        metrics = current()
+        if metrics is None or getattr(_local, 'in_cache', False):
+            return get(self, key, default, version)
+        _local.in_cache = True
+        try:
+            value = get(self, key, _MISSING, version)
+        finally:
+            _local.in_cache = False
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        metrics = current()
+        if metrics is None or getattr(_local, 'in_cache', False):
+            return get_many(self, keys, version)
+        keys = list(keys)
+        _local.in_cache = True
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            _local.in_cache = False
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.instrumented = True
+    return wrapper
+
+
+def install():
+    """Оборачивает отрисовку шаблонов Django и чтения из бэкендов
+    settings.CACHES. Вложенные обращения (L2 в TieredCache,
+    get_many через get) считаются один раз."""
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed_render(Template.render)
+    for config in settings.CACHES.values():
+        backend = import_string(config['BACKEND'])
+        if not getattr(backend.get, 'instrumented', False):
+            backend.get = _counted_get(backend.get)
+        if not getattr(backend.get_many, 'instrumented', False):
+            backend.get_many = _counted_get_many(backend.get_many)
@@ -0,0 +1,122 @@
+from django.conf import settings
+
+from . import metrics, profiling, querylog, routers
+
+PIN_COOKIE = 'primary_db'
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет пользователя за основной БД после записи.
+
+    Кука живёт REPLICA_PIN_SECONDS — дольше ожидаемой задержки
+    репликации; пока она есть, чтения идут в default.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.begin_request(pinned=PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request()
+        if wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """Считает SQL, шаблоны, кеш и размер ответа каждого запроса.
+
+    Итоги уходят в заголовок Server-Timing и в гистограммы по
+    представлениям (core.metrics), которые отдаёт /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        with metrics.measure() as measured:
+            response = self.get_response(request)
+        view = getattr(request.resolver_match, 'view_name', None)
+        view = view or 'unresolved'
+        response['Server-Timing'] = measured.server_timing()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, measured, view
+            )
+        else:
+            measured.observe(view, len(response.content))
+        return response
+
+    def stream(self, content, measured, view):
+        """Досчитывает потоковый ответ по мере отдачи."""
+        size = 0
+        with metrics.measure(measured):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        measured.observe(view, size)
+
+
+class QueryLogMiddleware:
+    """Пишет в лог yatube.queries медленные запросы к БД и запросы,
+    повторённые в одном HTTP-запросе (core.querylog)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_LOG_ENABLED:
+            return self.get_response(request)
+        with querylog.watch(request) as log:
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, log
+            )
+        else:
+            log.finish()
+        return response
+
+    def stream(self, content, request, log):
+        with querylog.watch(request, log):
+            yield from content
+        log.finish()
+
+
+class ProfilerMiddleware:
+    """Снимает статистический профиль выбранных запросов
+    (core.profiling.requested) и сохраняет его для админки."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.requested(request):
+            return self.get_response(request)
+        sampler = profiling.Sampler().start()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            profiling.save(request, sampler.stop())
+            raise
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, sampler
+            )
+        else:
+            profiling.save(request, sampler.stop())
+        return response
+
+    def stream(self, content, request, sampler):
+        try:
+            yield from content
+        finally:
+            profiling.save(request, sampler.stop())
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.CharField(max_length=100, verbose_name='Файл')),
+                ('path', models.CharField(max_length=500, verbose_name='Адрес')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('duration_ms', models.FloatField(verbose_name='Длительность, мс')),
+                ('samples', models.PositiveIntegerField(verbose_name='Выборок')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Снят')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+
+
+class ProfileCapture(models.Model):
+    """Снимок профиля запроса (core.profiling) в формате collapsed."""
+
+    file = models.CharField(max_length=100, verbose_name='Файл')
+    path = models.CharField(max_length=500, verbose_name='Адрес')
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    view = models.CharField(
+        max_length=200, blank=True, verbose_name='Представление'
+    )
+    duration_ms = models.FloatField(verbose_name='Длительность, мс')
+    samples = models.PositiveIntegerField(verbose_name='Выборок')
+    created = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name='Снят'
+    )
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+    @property
+    def full_path(self):
+        return Path(settings.PROFILER_DIR) / self.file
+
+    def delete(self, *args, **kwargs):
+        try:
+            self.full_path.unlink()
+        except FileNotFoundError:
+            pass
+        return super().delete(*args, **kwargs)
@@ -0,0 +1,119 @@
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SALT = 'core.profiling'
+PARAM = 'profile'
+
+
+def token():
+    """Подписанное значение параметра ?profile= для staff."""
+    return signing.TimestampSigner(salt=SALT).sign(PARAM)
+
+
+def requested(request):
+    """Профилировать ли запрос: каждый PROFILER_SAMPLE_RATE-й
+    в среднем или staff с действующим ?profile=<token()>."""
+    value = request.GET.get(PARAM)
+    if value and getattr(request, 'user', None) and request.user.is_staff:
+        try:
+            signing.TimestampSigner(salt=SALT).unsign(
+                value, max_age=settings.PROFILER_TOKEN_MAX_AGE
+            )
+            return True
+        except signing.BadSignature:
+            pass
+    rate = settings.PROFILER_SAMPLE_RATE
+    return bool(rate) and random.randrange(rate) == 0
+
+
+def collapse(frame):
+    """Стек в формате collapsed: корень слева, кадры через «;»."""
+    base = str(settings.BASE_DIR)
+    names = []
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base):
+            filename = str(Path(filename).relative_to(base))
+        else:
+            filename = Path(filename).name
+        names.append(
+            f'{frame.f_code.co_name} ({filename}:{frame.f_lineno})'
+            .replace(';', ',')
+        )
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Снимает стек потока каждые interval секунд из фонового потока.
+
+    Профиль статистический: поток запроса не замедляется ничем,
+    кроме борьбы за GIL с опрашивающим потоком.
+    """
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.PROFILER_INTERVAL
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name='profiler', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.most_common()
+        )
+
+
+def save(request, sampler):
+    """Пишет профиль в PROFILER_DIR и запоминает его в ProfileCapture;
+    хранятся последние PROFILER_KEEP снимков."""
+    from .models import ProfileCapture
+
+    directory = Path(settings.PROFILER_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.collapsed'
+    (directory / name).write_text(sampler.collapsed(), encoding='utf-8')
+    match = request.resolver_match
+    capture = ProfileCapture.objects.create(
+        file=name,
+        path=request.get_full_path()[:500],
+        method=request.method,
+        view=match.view_name if match else '',
+        duration_ms=round(sampler.duration * 1000, 1),
+        samples=sum(sampler.stacks.values()),
+    )
+    stale = ProfileCapture.objects.order_by('-created', '-pk')[
+        settings.PROFILER_KEEP:
+    ]
+    for old in stale:
+        old.delete()
+    return capture
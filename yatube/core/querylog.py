@@ -0,0 +1,116 @@
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+from django.utils import timezone
+
+logger = logging.getLogger('yatube.queries')
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+\b')
+# Обёртки инструментирования, а не источник запроса
+_OWN_FILES = tuple(
+    str(Path(__file__).with_name(name).resolve())
+    for name in ('querylog.py', 'metrics.py')
+)
+
+
+def fingerprint(sql):
+    """Структура запроса: без литералов и с IN-списком любой длины."""
+    sql = _IN_LIST.sub('(%s, ...)', sql)
+    sql = _STRING.sub("'?'", sql)
+    return _NUMBER.sub('N', sql)
+
+
+def origin():
+    """Откуда выполнен запрос: строка шаблона и строка кода проекта."""
+    template = None
+    code = None
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        filename = frame.f_code.co_filename
+        node = frame.f_locals.get('self')
+        if (template is None and frame.f_code.co_name == 'render_annotated'
+                and isinstance(node, Node)
+                and getattr(node, 'token', None) is not None):
+            name = node.origin.template_name or node.origin.name
+            template = f'{name}:{node.token.lineno}'
+        elif (code is None and filename.startswith(base)
+              and filename not in _OWN_FILES):
+            code = (f'{Path(filename).relative_to(base)}:{frame.f_lineno} '
+                    f'in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return {'template': template, 'code': code}
+
+
+class QueryLog:
+    """Медленные и повторяющиеся запросы одного HTTP-запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.durations = Counter()
+        self.origins = {}
+
+    @property
+    def view(self):
+        match = self.request.resolver_match
+        return match.view_name if match else self.request.path
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            key = fingerprint(sql)
+            with self._lock:
+                self.counts[key] += 1
+                self.durations[key] += elapsed
+                count = self.counts[key]
+            if elapsed >= settings.QUERY_LOG_SLOW_MS:
+                self.write('slow', key, ms=round(elapsed, 2), **origin())
+            elif (count == settings.QUERY_LOG_DUPLICATES
+                    and key not in self.origins):
+                self.origins[key] = origin()
+
+    def finish(self):
+        """Пишет в лог запросы, повторённые QUERY_LOG_DUPLICATES раз
+        и больше — признак N+1."""
+        for key, count in self.counts.items():
+            if count >= settings.QUERY_LOG_DUPLICATES:
+                self.write(
+                    'duplicate', key, count=count,
+                    ms=round(self.durations[key], 2),
+                    **self.origins.get(key, {})
+                )
+
+    def write(self, kind, sql, **fields):
+        logger.warning(json.dumps(
+            dict(kind=kind, view=self.view, sql=sql,
+                 at=timezone.now().isoformat(timespec='seconds'), **fields),
+            ensure_ascii=False
+        ))
+
+
+@contextmanager
+def watch(request, log=None):
+    """Ведёт QueryLog запроса по всем соединениям, пока открыт
+    контекст; log — продолжить начатый (для потоковых ответов)."""
+    log = log or QueryLog(request)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log.execute))
+        yield log
@@ -0,0 +1,87 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Записи этих приложений не делают пользователя «писавшим»: сессия
+# сохраняется почти на каждый запрос.
+UNPINNED_APPS = {'sessions'}
+# Производные данные, которые создаются и при чтении: счётчики, сводки
+# авторов, миниатюры, профили и рекомендации. Это не изменения
+# пользователя, которые он должен сразу увидеть.
+UNPINNED_MODELS = {
+    'posts.feedcounter', 'posts.authorstats', 'posts.followsuggestion',
+    'posts.suggestionqueue', 'core.profilecapture', 'thumbnail.kvstore',
+}
+
+_state = threading.local()
+
+
+def _get(name):
+    return getattr(_state, name, False)
+
+
+@contextmanager
+def replica_reads():
+    """Чтения внутри блока уходят на реплику, если пользователь
+    не закреплён за основной БД."""
+    previous = _get('replica')
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def begin_request(pinned):
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+def end_request():
+    """Завершает запрос; True, если в нём была запись."""
+    wrote = _get('wrote')
+    _state.pinned = False
+    _state.wrote = False
+    return wrote
+
+
+def snapshot():
+    """Состояние маршрутизации для передачи в другой поток."""
+    return _get('replica'), _get('pinned')
+
+
+@contextmanager
+def restored(state):
+    previous = snapshot()
+    _state.replica, _state.pinned = state
+    try:
+        yield
+    finally:
+        _state.replica, _state.pinned = previous
+
+
+class ReplicaRouter:
+    """Чтения из представлений под replica_reads — на одну из
+    DATABASE_REPLICAS, все записи — на default.
+
+    Пользователь, который только что писал, закреплён за default
+    (core.middleware.ReplicaPinMiddleware) и видит свои изменения
+    без задержки репликации.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and _get('replica') and not _get('pinned'):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if (model._meta.app_label not in UNPINNED_APPS
+                and model._meta.label_lower not in UNPINNED_MODELS):
+            _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
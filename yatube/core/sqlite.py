@@ -0,0 +1,47 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+try:
+    import fcntl
+except ImportError:  # Windows: только замок процесса
+    fcntl = None
+
+_write_lock = threading.Lock()
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _lock_path():
+    name = str(connection.settings_dict['NAME'])
+    if name == ':memory:' or name.startswith('file:'):
+        return None
+    return name + '.write-lock'
+
+
+@contextmanager
+def write_queue():
+    """Очередь писателей: замок потоков процесса и файловый замок
+    рядом с БД, общий для всех процессов на этой машине."""
+    with _write_lock:
+        path = _lock_path() if fcntl is not None else None
+        if path is None:
+            yield
+            return
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
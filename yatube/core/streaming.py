@@ -0,0 +1,64 @@
+from itertools import islice
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.template import RequestContext, loader
+from django.utils.safestring import mark_safe
+
+STREAM_MARKER = mark_safe('<!-- stream -->')
+
+
+def chunks(iterable, size):
+    """Разбивает итератор на списки не длиннее size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_render(request, template_name, context, rows, item_template,
+                  item_name, item_context=None, prepare=None,
+                  footer_template=None, chunk_size=100, separator=''):
+    """Потоковый аналог render().
+
+    Шаблон страницы рендерится с переменной stream_marker, которую он
+    выводит вместо списка. Часть страницы до маркера отдаётся сразу,
+    затем rows читаются пачками по chunk_size (QuerySet — серверным
+    курсором через iterator()): пачка проходит через
+    prepare и рендерится шаблоном item_template; между строками
+    выводится separator (forloop в item_template нет). После списка идёт
+    footer_template (ему уже известно всё о прочитанных строках)
+    и остаток страницы.
+    """
+    page = loader.get_template(template_name).render(
+        dict(context, stream_marker=STREAM_MARKER), request
+    )
+    head, _, tail = page.partition(STREAM_MARKER)
+    if isinstance(rows, QuerySet):
+        rows = rows.iterator(chunk_size)
+
+    def content():
+        yield head
+        item = loader.get_template(item_template).template
+        request_context = RequestContext(request, context)
+        request_context.update(item_context or {})
+        first = True
+        with request_context.bind_template(item):
+            for chunk in chunks(rows, chunk_size):
+                if prepare is not None:
+                    chunk = prepare(chunk)
+                parts = []
+                for row in chunk:
+                    if not first:
+                        parts.append(separator)
+                    first = False
+                    with request_context.push({item_name: row}):
+                        parts.append(item.render(request_context))
+                yield ''.join(parts)
+        if footer_template is not None:
+            yield loader.render_to_string(footer_template, context, request)
+        yield tail
+
+    return StreamingHttpResponse(content())
@@ -0,0 +1,102 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import MESSAGE_KEY, SEQUENCE_KEY, TieredCache, locked
+
+TIERED_OPTIONS = {'L2': 'shared', 'L1_MAX_ENTRIES': 2, 'POLL_INTERVAL': 0}
+
+
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.directory.name,
+            },
+        })
+        self.settings.enable()
+        self.worker = TieredCache(None, {'OPTIONS': TIERED_OPTIONS})
+        self.other = TieredCache(None, {'OPTIONS': TIERED_OPTIONS})
+
+    def tearDown(self):
+        caches['shared'].clear()
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_second_read_served_from_l1(self):
+        """Повторное чтение не обращается к L2"""
+        self.worker.set('key', 'value')
+        self.other.get('key')
+        self.other.get('key')
+        stats = self.other.metrics()
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l1_hits'], 1)
+
+    def test_write_invalidates_other_workers(self):
+        """Запись в одном процессе выбрасывает ключ из L1 другого"""
+        self.worker.set('key', 'old')
+        self.assertEqual(self.other.get('key'), 'old')
+        self.worker.set('key', 'new')
+        self.assertEqual(self.other.get('key'), 'new')
+        self.worker.delete('key')
+        self.assertIsNone(self.other.get('key'))
+
+    def test_l1_is_bounded(self):
+        """L1 вытесняет давно не использованные ключи"""
+        for key in ('a', 'b', 'c'):
+            self.worker.set(key, key)
+        stats = self.worker.metrics()
+        self.assertEqual(stats['l1_entries'], 2)
+        self.assertEqual(stats['l1_evictions'], 1)
+        self.assertEqual(self.worker.get('a'), 'a')
+
+    def test_concurrent_writers_get_distinct_messages(self):
+        """Одновременные записи не теряют сообщений об инвалидации"""
+        def write(worker, number):
+            for i in range(25):
+                worker.set(f'key-{number}-{i}', i)
+
+        with ThreadPoolExecutor(4) as pool:
+            for number in range(4):
+                pool.submit(
+                    write, (self.worker, self.other)[number % 2], number
+                )
+        shared = caches['shared']
+        self.assertEqual(shared.get(SEQUENCE_KEY), 100)
+        messages = shared.get_many(
+            [MESSAGE_KEY.format(n) for n in range(1, 101)]
+        )
+        self.assertEqual(len(messages), 100)
+
+    def test_locked_update_keeps_concurrent_changes(self):
+        """Чтение-изменение-запись под locked не теряет изменений"""
+        self.worker.set('list', [])
+
+        def append(worker, number):
+            with locked('list') as source:
+                worker.set('list', source.get('list') + [number])
+
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache.TieredCache',
+                        'OPTIONS': TIERED_OPTIONS},
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.directory.name,
+            },
+        }):
+            with ThreadPoolExecutor(4) as pool:
+                for number in range(40):
+                    pool.submit(
+                        append, (self.worker, self.other)[number % 2], number
+                    )
+        self.assertCountEqual(caches['shared'].get('list'), range(40))
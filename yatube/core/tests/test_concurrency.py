@@ -0,0 +1,46 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from .. import metrics
+from ..concurrency import defer
+
+
+class DeferTests(SimpleTestCase):
+
+    @override_settings(CONCURRENT_QUERY_WORKERS=2)
+    def test_calls_run_concurrently(self):
+        """Отложенные вызовы выполняются одновременно в пуле"""
+        barrier = threading.Barrier(2, timeout=5)
+        first = defer(barrier.wait)
+        second = defer(barrier.wait)
+        self.assertEqual({first.result(), second.result()}, {0, 1})
+
+    @override_settings(CONCURRENT_QUERY_WORKERS=2)
+    def test_error_raised_on_result(self):
+        """Исключение из пула пробрасывается в result()"""
+        future = defer(int, 'не число')
+        with self.assertRaises(ValueError):
+            future.result()
+
+    @override_settings(CONCURRENT_QUERY_WORKERS=0)
+    def test_runs_inline_without_workers(self):
+        """Без пула вызов выполняется сразу в текущем потоке"""
+        done = defer(threading.current_thread)
+        self.assertIs(done.result(), threading.current_thread())
+        with self.assertRaises(ValueError):
+            defer(int, 'не число').result()
+
+
+@override_settings(CONCURRENT_QUERY_WORKERS=2)
+class DeferInstrumentationTests(TransactionTestCase):
+
+    def test_pool_queries_are_measured(self):
+        """Запросы потока пула попадают в метрики запроса"""
+        users = get_user_model().objects
+        with metrics.measure() as measured:
+            future = defer(users.count)
+            users.exists()
+            future.result()
+        self.assertEqual(measured.queries, 2)
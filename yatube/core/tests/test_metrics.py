@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import engines
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .. import metrics
+
+User = get_user_model()
+
+
+class RollingHistogramTests(SimpleTestCase):
+
+    def test_window_expires(self):
+        """Наблюдения старше окна выпадают из гистограммы."""
+        histogram = metrics.RollingHistogram((1, 5), window=10, slots=5)
+        histogram.observe(0.5, now=0)
+        histogram.observe(3, now=4)
+        histogram.observe(7, now=4)
+        self.assertEqual(histogram.snapshot(now=5), ([1, 2], 10.5, 3))
+        self.assertEqual(histogram.snapshot(now=11), ([0, 1], 10, 2))
+        self.assertEqual(histogram.snapshot(now=30), ([0, 0], 0, 0))
+
+    def test_cache_and_templates_counted(self):
+        """Чтения кеша и отрисовка шаблона попадают в метрики запроса."""
+        cache.set('metrics-test', 1)
+        template = engines['django'].from_string('{{ value }}')
+        with metrics.measure() as measured:
+            cache.get('metrics-test')
+            cache.get('metrics-missing')
+            cache.get_many(['metrics-test', 'metrics-missing'])
+            template.render({'value': 1})
+        self.assertEqual((measured.cache_hits, measured.cache_misses), (2, 2))
+        self.assertGreater(measured.template, 0)
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def test_server_timing_and_prometheus(self):
+        """Ответ несёт Server-Timing, а /metrics/ — гистограммы вида."""
+        response = self.client.get(reverse('post:index'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.client.force_login(self.staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE yatube_sql_queries histogram', body)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="post:index"} 1',
+            body
+        )
+        self.assertIn('yatube_response_size_bytes_bucket{view="post:index"',
+                      body)
+
+    def test_staff_only(self):
+        """Не-staff не видит метрики."""
+        self.client.force_login(
+            User.objects.create_user(username='regular')
+        )
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,83 @@
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import profiling
+from ..models import ProfileCapture
+
+User = get_user_model()
+
+
+def busy(seconds):
+    finish = time.perf_counter() + seconds
+    while time.perf_counter() < finish:
+        pass
+
+
+class ProfilerTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            PROFILER_DIR=self.directory.name, PROFILER_INTERVAL=0.001
+        )
+        self.settings.enable()
+        self.staff = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_sampler_collects_stacks(self):
+        """Профиль содержит стек работающей функции."""
+        sampler = profiling.Sampler().start()
+        busy(0.05)
+        sampler.stop()
+        self.assertTrue(sampler.stacks)
+        line = sampler.collapsed().splitlines()[0]
+        stack, count = line.rsplit(' ', 1)
+        self.assertIn('busy (core/tests/test_profiling.py:', stack)
+        self.assertGreater(int(count), 0)
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_sampled_request_saved(self):
+        """Выбранный запрос сохраняется в файл и в ProfileCapture."""
+        self.client.get(reverse('post:index'))
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(capture.view, 'post:index')
+        self.assertEqual(capture.method, 'GET')
+        self.assertTrue(capture.full_path.is_file())
+
+    def test_signed_param_for_staff_only(self):
+        """?profile= работает только с верной подписью и для staff."""
+        url = reverse('post:index')
+        self.client.get(url, {'profile': profiling.token()})
+        self.assertFalse(ProfileCapture.objects.exists())
+        self.client.force_login(self.staff)
+        self.client.get(url, {'profile': 'forged'})
+        self.assertFalse(ProfileCapture.objects.exists())
+        self.client.get(url, {'profile': profiling.token()})
+        self.assertEqual(ProfileCapture.objects.count(), 1)
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_KEEP=2)
+    def test_admin_lists_recent_captures(self):
+        """Админка показывает последние снимки и отдаёт их файлы."""
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('about:tech'))
+        self.assertEqual(ProfileCapture.objects.count(), 2)
+        with override_settings(PROFILER_SAMPLE_RATE=0):
+            response = self.client.get(
+                reverse('admin:core_profilecapture_changelist')
+            )
+            self.assertContains(response, '/about/tech/')
+            capture = ProfileCapture.objects.first()
+            response = self.client.get(reverse(
+                'admin:core_profilecapture_download', args=[capture.pk]
+            ))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,78 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import querylog
+
+User = get_user_model()
+
+
+@override_settings(
+    QUERY_LOG_ENABLED=True, QUERY_LOG_SLOW_MS=10 ** 6, QUERY_LOG_DUPLICATES=3
+)
+class QueryLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(4):
+            author = User.objects.create_user(username=f'author-{number}')
+            Post.objects.create(author=author, text=f'Пост {number}')
+
+    def entries(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_fingerprint(self):
+        """Литералы и длина IN-списка не меняют отпечаток."""
+        self.assertEqual(
+            querylog.fingerprint("SELECT 1 WHERE a IN (%s, %s) AND b = 'x'"),
+            querylog.fingerprint("SELECT 7 WHERE a IN (%s) AND b = 'yy'"),
+        )
+
+    def test_duplicates_point_to_template_line(self):
+        """N+1 в шаблоне попадает в лог с именем и строкой шаблона."""
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}'
+        )
+        request = RequestFactory().get('/n-plus-one/')
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            with querylog.watch(request) as log:
+                template.render({'posts': Post.objects.all()})
+            log.finish()
+        entry, = self.entries(logs)
+        self.assertEqual(entry['kind'], 'duplicate')
+        self.assertEqual(entry['count'], 4)
+        self.assertEqual(entry['view'], '/n-plus-one/')
+        self.assertTrue(entry['template'].endswith(':2'))
+        self.assertIn('auth_user', entry['sql'])
+
+    @override_settings(QUERY_LOG_SLOW_MS=0)
+    def test_slow_queries_name_view(self):
+        """Медленный запрос записывается с именем представления."""
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            self.client.get(reverse('post:index'))
+        kinds = {(entry['kind'], entry['view'])
+                 for entry in self.entries(logs)}
+        self.assertIn(('slow', 'post:index'), kinds)
+
+    def test_summary_command(self):
+        """query_log сводит записи из журнала и его ротаций."""
+        entry = {'kind': 'duplicate', 'view': 'post:index', 'sql': 'SELECT',
+                 'count': 5, 'ms': 2.0, 'template': 'posts/index.html:7'}
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'queries.log'
+            path.write_text(json.dumps(entry) + '\n')
+            Path(f'{path}.1').write_text(json.dumps(entry) + '\nмусор\n')
+            out = StringIO()
+            call_command('query_log', file=str(path), stdout=out)
+        self.assertIn('раз: 2, запросов: 10', out.getvalue())
+        self.assertIn('posts/index.html:7', out.getvalue())
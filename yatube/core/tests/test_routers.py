@@ -0,0 +1,56 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from posts.models import AuthorStats, FeedCounter, Post
+
+from .. import routers
+from ..decorators import read_replica
+from ..middleware import PIN_COOKIE, ReplicaPinMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.routed = []
+
+    def view(self, request, write=None):
+        self.routed.append(self.router.db_for_read(Post))
+        if write:
+            self.router.db_for_write(write)
+        return HttpResponse()
+
+    def get(self, view, cookies=None, **kwargs):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinMiddleware(
+            lambda request: view(request, **kwargs)
+        )(request)
+
+    def test_read_views_use_replica(self):
+        """Чтения представлений под read_replica идут на реплику,
+        остальные — на основную БД"""
+        self.get(read_replica(self.view))
+        self.get(self.view)
+        self.assertEqual(self.routed, ['replica', None])
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_write_pins_user_to_primary(self):
+        """После записи пользователь читает из основной БД"""
+        response = self.get(self.view, write=Post)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        response = self.get(
+            read_replica(self.view), cookies={PIN_COOKIE: '1'}
+        )
+        self.assertEqual(self.routed, [None, None])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_derived_data_writes_do_not_pin(self):
+        """Счётчики и сводки, созданные при чтении, не закрепляют
+        пользователя за основной БД"""
+        for model in (FeedCounter, AuthorStats):
+            with self.subTest(model=model):
+                response = self.get(read_replica(self.view), write=model)
+                self.assertNotIn(PIN_COOKIE, response.cookies)
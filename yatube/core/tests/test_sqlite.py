@@ -0,0 +1,86 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..decorators import serialize_writes
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 1234,
+    'cache_size': -2048,
+}
+
+
+class SQLiteTuningTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS)
+    def test_pragmas_applied_on_connect(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': str(Path(directory) / 'tuned.sqlite3'),
+            }})
+            tuned = handler['default']
+            try:
+                with tuned.cursor() as cursor:
+                    values = {}
+                    for name in PRAGMAS:
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                tuned.close()
+        self.assertEqual(values, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': 1234,
+            'cache_size': -2048,
+        })
+
+    def flaky_view(self, request):
+        self.calls += 1
+        if self.calls < 3:
+            raise OperationalError('database is locked')
+        return HttpResponse('ok')
+
+    @override_settings(SQLITE_SERIALIZE_WRITES=True, SQLITE_WRITE_RETRIES=3)
+    @mock.patch('core.decorators.time.sleep')
+    def test_locked_write_retried(self, sleep):
+        """Запись, упавшая на блокировке, повторяется."""
+        response = serialize_writes(self.flaky_view)(self.factory.post('/'))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.calls, 3)
+
+    @override_settings(SQLITE_SERIALIZE_WRITES=True, SQLITE_WRITE_RETRIES=1)
+    @mock.patch('core.decorators.time.sleep')
+    def test_retries_exhausted(self, sleep):
+        """Исчерпав попытки, декоратор пробрасывает ошибку."""
+        with self.assertRaises(OperationalError):
+            serialize_writes(self.flaky_view)(self.factory.post('/'))
+        self.assertEqual(self.calls, 2)
+
+    @override_settings(SQLITE_SERIALIZE_WRITES=True)
+    def test_reads_not_serialized(self):
+        """GET-запросы идут мимо очереди и без повторов."""
+        with self.assertRaises(OperationalError):
+            serialize_writes(self.flaky_view)(self.factory.get('/'))
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(SQLITE_SERIALIZE_WRITES=True, SQLITE_WRITE_RETRIES=3)
+    @mock.patch('core.decorators.time.sleep')
+    def test_get_writes_serialized(self, sleep):
+        """Представления, пишущие на GET, встают в очередь."""
+        view = serialize_writes(all_methods=True)(self.flaky_view)
+        response = view(self.factory.get('/'))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.calls, 3)
@@ -1,5 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics as request_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +20,15 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html', status=403)
+
+
+@staff_member_required
+def metrics(request):
+    """Гистограммы запросов в формате Prometheus (только для staff)."""
+    extra = {}
+    if hasattr(cache, 'metrics'):
+        extra['tiered_cache'] = ('Статистика TieredCache', cache.metrics())
+    return HttpResponse(
+        request_metrics.prometheus(extra),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
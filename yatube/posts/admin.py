@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from posts import search
 from posts.models import Group, Post
 
 
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу posts.search вместо LIKE по тексту."""
+        if not search_term:
+            return queryset, False
+        return search.filter_queryset(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+COUNT_FIELDS = (
+    'posts_count', 'followers_count', 'following_count', 'comments_count'
+)
+FIELDS = COUNT_FIELDS + ('last_post_date',)
+
+
+def create(author):
+    """Пустая сводка нового пользователя."""
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author=author)], ignore_conflicts=True
+    )
+
+
+def get(author):
+    """Сводка автора одним запросом.
+
+    Строки создаются миграцией и при регистрации; отсутствующая строка
+    (пользователь добавлен в обход сигналов, например bulk_create)
+    считается агрегатами и сохраняется.
+    """
+    stats = AuthorStats.objects.filter(author=author).first()
+    if stats is None:
+        stats, = compute([author.pk])
+        AuthorStats.objects.bulk_create([stats], ignore_conflicts=True)
+    return stats
+
+
+def _grouped(queryset, field, **aggregates):
+    return {
+        row.pop(field): row
+        for row in queryset.values(field).annotate(**aggregates)
+        .order_by()
+    }
+
+
+def compute(author_ids=None):
+    """Несохранённые сводки, посчитанные агрегатами по таблицам.
+
+    Без author_ids — для всех пользователей.
+    """
+    users = User.objects.all()
+    posts = Post.objects.all()
+    followers = Follow.objects.all()
+    following = Follow.objects.all()
+    comments = Comment.objects.all()
+    if author_ids is not None:
+        users = users.filter(pk__in=author_ids)
+        posts = posts.filter(author__in=author_ids)
+        followers = followers.filter(author__in=author_ids)
+        following = following.filter(user__in=author_ids)
+        comments = comments.filter(author__in=author_ids)
+    aggregates = (
+        _grouped(posts, 'author',
+                 posts_count=Count('pk'), last_post_date=Max('pub_date')),
+        _grouped(followers, 'author', followers_count=Count('pk')),
+        _grouped(following, 'user', following_count=Count('pk')),
+        _grouped(comments, 'author', comments_count=Count('pk')),
+    )
+    result = []
+    for pk in users.values_list('pk', flat=True).order_by('pk'):
+        stats = AuthorStats(author_id=pk)
+        for grouped in aggregates:
+            for field, value in grouped.get(pk, {}).items():
+                setattr(stats, field, value)
+        result.append(stats)
+    return result
+
+
+def rebuild(batch_size=500):
+    """Пересчитывает все сводки заново; возвращает число строк."""
+    stats = compute()
+    with transaction.atomic():
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.bulk_create(stats, batch_size=batch_size)
+    return len(stats)
+
+
+def refresh(author_ids):
+    """Пересчитывает сводки указанных авторов (не больше нескольких
+    сотен за вызов — они уходят в IN)."""
+    stats = compute(author_ids)
+    with transaction.atomic():
+        AuthorStats.objects.filter(author_id__in=author_ids).delete()
+        AuthorStats.objects.bulk_create(stats)
+
+
+def check(fix=False):
+    """Расхождения сохранённых сводок с агрегатами.
+
+    Список (author_id, поле, сохранено, на самом деле). Строки, которых
+    ещё нет, расхождением не считаются: они посчитаются при чтении.
+    При fix=True расходящиеся строки перезаписываются.
+    """
+    stored = AuthorStats.objects.in_bulk()
+    problems = []
+    broken = []
+    for actual in compute():
+        row = stored.get(actual.author_id)
+        if row is None:
+            continue
+        diff = [
+            (actual.author_id, field, getattr(row, field),
+             getattr(actual, field))
+            for field in FIELDS
+            if getattr(row, field) != getattr(actual, field)
+        ]
+        if diff:
+            problems.extend(diff)
+            broken.append(actual)
+    if fix and broken:
+        with transaction.atomic():
+            AuthorStats.objects.filter(
+                author_id__in=[stats.author_id for stats in broken]
+            ).delete()
+            AuthorStats.objects.bulk_create(broken)
+    return problems
+
+
+def bump(author_id, **deltas):
+    """Сдвигает счётчики уже созданной сводки автора."""
+    AuthorStats.objects.filter(author_id=author_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def post_added(post):
+    """Новый пост: +1 к постам и, если он свежее, новая дата."""
+    date = Value(post.pub_date, output_field=models.DateTimeField())
+    AuthorStats.objects.filter(author_id=post.author_id).update(
+        posts_count=F('posts_count') + 1,
+        last_post_date=Greatest(Coalesce('last_post_date', date), date),
+    )
+
+
+def post_removed(author_id):
+    """Пост удалён или передан другому автору: −1 и дата последнего
+    из оставшихся постов тем же запросом."""
+    latest = Post.objects.filter(
+        author=OuterRef('author_id')
+    ).order_by('-pub_date').values('pub_date')[:1]
+    AuthorStats.objects.filter(author_id=author_id).update(
+        posts_count=F('posts_count') - 1,
+        last_post_date=Subquery(latest),
+    )
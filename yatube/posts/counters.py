@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import Count, F, Max
+
+from .models import FeedCounter, Post
+
+POSTS_KEY = 'posts'
+
+
+def group_key(group_id):
+    return f'posts:group:{group_id}'
+
+
+def _create(key, queryset):
+    """Создаёт счётчик одним INSERT ... SELECT COUNT(*).
+
+    Подсчёт и вставка идут одной командой: пост, сохранённый между
+    отдельными COUNT(*) и INSERT, сдвинул бы ещё не созданную строку, и
+    счётчик навсегда разошёлся бы на единицу.
+    """
+    database = router.db_for_write(FeedCounter)
+    ops = connections[database].ops
+    table = ops.quote_name(FeedCounter._meta.db_table)
+    sql, params = queryset.using(database).order_by().values(
+        'pk'
+    ).query.sql_with_params()
+    with connections[database].cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            f'({ops.quote_name("key")}, {ops.quote_name("value")}) '
+            f'SELECT %s, COUNT(*) FROM ({sql}) counted '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [key, *params]
+        )
+
+
+def _stored_count(key, queryset):
+    """Значение счётчика; при первом обращении считается COUNT(*)."""
+    stored = FeedCounter.objects.filter(key=key).values_list(
+        'value', flat=True
+    )
+    value = stored.first()
+    if value is None:
+        _create(key, queryset)
+        value = stored.using(router.db_for_write(FeedCounter)).first()
+    return value
+
+
+def _estimated_posts():
+    """Оценка числа постов по статистике БД без сканирования таблицы."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [Post._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return Post.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def count(key, queryset):
+    """Число строк queryset в режиме settings.POSTS_COUNT_MODE.
+
+    exact — COUNT(*) на каждый запрос, counter — счётчик FeedCounter,
+    estimated — оценка для общей ленты, счётчик для остальных.
+    """
+    mode = settings.POSTS_COUNT_MODE
+    if mode == 'exact':
+        return queryset.count()
+    if mode == 'estimated' and key == POSTS_KEY:
+        return _estimated_posts()
+    return _stored_count(key, queryset)
+
+
+def posts_count(group=None):
+    """Число постов ленты; счётчики авторов — в posts.author_stats."""
+    if group is not None:
+        return count(group_key(group.pk), Post.objects.filter(group=group))
+    return count(POSTS_KEY, Post.objects.all())
+
+
+def bump(key, delta):
+    """Сдвигает уже созданный счётчик; отсутствующий посчитается лениво."""
+    FeedCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def reset():
+    """Сбрасывает все счётчики, например после bulk_create."""
+    FeedCounter.objects.all().delete()
+
+
+def compute():
+    """Настоящие значения счётчиков: общего и по группам с постами."""
+    values = {POSTS_KEY: Post.objects.count()}
+    by_group = Post.objects.exclude(group=None).values_list(
+        'group'
+    ).annotate(total=Count('pk')).order_by()
+    for group_id, total in by_group:
+        values[group_key(group_id)] = total
+    return values
+
+
+def rebuild():
+    """Пересчитывает все счётчики заново; возвращает число строк."""
+    with transaction.atomic():
+        values = compute()
+        FeedCounter.objects.all().delete()
+        FeedCounter.objects.bulk_create(
+            FeedCounter(key=key, value=value) for key, value in values.items()
+        )
+    return len(values)
+
+
+def check(fix=False):
+    """Расхождения сохранённых счётчиков с COUNT(*).
+
+    Список (ключ, сохранено, на самом деле). Счётчики, которых ещё нет,
+    расхождением не считаются: они посчитаются при чтении. При fix=True
+    расходящиеся строки перезаписываются.
+    """
+    actual = compute()
+    problems = [
+        (key, value, actual.get(key, 0))
+        for key, value in FeedCounter.objects.values_list('key', 'value')
+        if value != actual.get(key, 0)
+    ]
+    if fix:
+        for key, _, value in problems:
+            FeedCounter.objects.filter(key=key).update(value=value)
+    return problems
@@ -0,0 +1,77 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page
+
+from .fragments import stamp
+from .paginators import CountedPaginator, CursorPage, CursorPaginator
+
+
+def enabled():
+    """Страницы кешируются, только если кеш общий для воркеров:
+    иначе сброс из сигнала не дойдёт до остальных процессов."""
+    return settings.CACHE_SHARED
+
+
+def version_key(scope):
+    return f'feed:{scope}'
+
+
+def version(scope):
+    """Текущая версия ленты; страницы прошлых версий недостижимы."""
+    key = version_key(scope)
+    current = cache.get(key)
+    if current is None:
+        current = stamp()
+        if not cache.add(key, current, None):
+            current = cache.get(key, current)
+    return current
+
+
+def bump(*scopes):
+    """Сбрасывает все закешированные страницы лент за O(1)."""
+    cache.set_many({version_key(scope): stamp() for scope in scopes}, None)
+
+
+def page_key(scope, request):
+    position = request.GET.get('cursor') or request.GET.get('page') or ''
+    digest = hashlib.md5(position.encode()).hexdigest()
+    return f'feed:{scope}:{version(scope)}:{digest}'
+
+
+def load(key, posts, per_page):
+    """Восстанавливает страницу из кеша, не обращаясь к БД.
+
+    У страницы есть fetched — метка stamp() до чтения её строк.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry['keyset']:
+        page_obj = CursorPage(
+            entry['object_list'],
+            entry['number'],
+            CursorPaginator(posts, per_page),
+            next_cursor=entry['next_cursor'],
+            previous_cursor=entry['previous_cursor'],
+        )
+    else:
+        count = entry['count']
+        paginator = CountedPaginator(posts, per_page, lambda: count)
+        page_obj = Page(entry['object_list'], entry['number'], paginator)
+    page_obj.fetched = entry.get('fetched')
+    return page_obj
+
+
+def store(key, page_obj, fetched):
+    keyset = isinstance(page_obj, CursorPage)
+    cache.set(key, {
+        'keyset': keyset,
+        'number': page_obj.number,
+        'object_list': list(page_obj.object_list),
+        'count': None if keyset else page_obj.paginator.count,
+        'next_cursor': getattr(page_obj, 'next_cursor', None),
+        'previous_cursor': getattr(page_obj, 'previous_cursor', None),
+        'fetched': fetched,
+    }, settings.POSTS_FEED_CACHE_TIMEOUT)
@@ -0,0 +1,75 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+
+def enabled():
+    """Подписки кешируются, только если кеш общий для воркеров: сигнал
+    меняет множество лишь в кеше процесса, принявшего подписку."""
+    return settings.CACHE_SHARED
+
+
+def key(user):
+    # В ключе и дата регистрации: SQLite может выдать id удалённого
+    # пользователя новому, и тот не должен унаследовать чужие подписки
+    return f'follows:{user.pk}:{user.date_joined.timestamp():.6f}'
+
+
+def _store(user, author_ids):
+    cache.set(
+        key(user), array('q', sorted(author_ids)),
+        settings.POSTS_FOLLOW_GRAPH_TIMEOUT
+    )
+
+
+def following(user):
+    """id авторов, на которых подписан пользователь.
+
+    В кеше лежит отсортированный array('q') — 8 байт на подписку;
+    наружу отдаётся frozenset для проверок за O(1). Без общего кеша
+    список читается из БД.
+    """
+    if not enabled():
+        return frozenset(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True
+        ))
+    author_ids = cache.get(key(user))
+    if author_ids is None:
+        author_ids = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True
+        )
+        author_ids = array('q', sorted(author_ids))
+        _store(user, author_ids)
+    return frozenset(author_ids)
+
+
+def follows(user, author_id):
+    """Подписан ли user на автора; без запроса к БД при тёплом кеше."""
+    if not user.is_authenticated:
+        return False
+    if not enabled():
+        return Follow.objects.filter(user=user, author_id=author_id).exists()
+    return author_id in following(user)
+
+
+def _update(user, change):
+    if not enabled():
+        return
+    author_ids = cache.get(key(user))
+    if author_ids is None:
+        return
+    author_ids = set(author_ids)
+    change(author_ids)
+    _store(user, author_ids)
+
+
+def add(user, author_id):
+    """Новая подписка попадает в уже собранное множество."""
+    _update(user, lambda author_ids: author_ids.add(author_id))
+
+
+def remove(user, author_id):
+    _update(user, lambda author_ids: author_ids.discard(author_id))
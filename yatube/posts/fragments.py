@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def stamp():
+    return str(time.time_ns())
+
+
+def enabled():
+    """Карточки кешируются, только если кеш общий для воркеров:
+    иначе сброс из сигнала не дойдёт до остальных процессов."""
+    return settings.CACHE_SHARED
+
+
+def _version_keys(post):
+    return (
+        f'card:post:{post.pk}',
+        f'card:user:{post.author_id}',
+        f'card:group:{post.group_id}',
+    )
+
+
+def card_versions(posts, since=None):
+    """Проставляет постам версию карточки одним запросом к кешу.
+
+    Версия складывается из меток поста, автора и группы; отсутствующая
+    метка создаётся заново, поэтому старые фрагменты становятся
+    недостижимыми, а не устаревшими.
+
+    since — stamp(), взятый до чтения строк постов (по умолчанию —
+    момент вызова). Если метка новее, строка могла быть прочитана до
+    изменения, и карточка не кешируется (card_version = None): иначе
+    старый текст лёг бы в кеш под новой версией. Поэтому и только что
+    созданные метки в первый раз карточку не кешируют.
+    """
+    since = int(since or stamp())
+    posts = list(posts)
+    if not enabled():
+        for post in posts:
+            post.card_version = None
+        return posts
+    keys = {key for post in posts for key in _version_keys(post)}
+    versions = cache.get_many(keys)
+    missing = {key: stamp() for key in keys - versions.keys()}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    for post in posts:
+        parts = [versions[key] for key in _version_keys(post)]
+        if any(int(part) > since for part in parts):
+            post.card_version = None
+        else:
+            post.card_version = '.'.join(parts)
+    return posts
+
+
+def bump(kind, pk):
+    """Сбрасывает кешированные карточки поста, автора или группы."""
+    cache.set(f'card:{kind}:{pk}', stamp(), None)
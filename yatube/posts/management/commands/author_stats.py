@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import author_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводки авторов (AuthorStats) агрегатами; '
+            'с --check сверяет сохранённые сводки с таблицами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить сводки и вывести расхождения.'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Вместе с --check перезаписать расходящиеся строки.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            total = author_stats.rebuild()
+            self.stdout.write(f'Пересчитано сводок: {total}')
+            return
+        problems = author_stats.check(fix=options['fix'])
+        for author_id, field, stored, actual in problems:
+            self.stdout.write(
+                f'{author_id} {field}: сохранено {stored}, '
+                f'на самом деле {actual}'
+            )
+        if not problems:
+            self.stdout.write('Сводки авторов согласованы.')
+        elif options['fix']:
+            self.stdout.write(f'Исправлено расхождений: {len(problems)}')
+        else:
+            raise CommandError(f'Расхождений: {len(problems)}')
@@ -0,0 +1,156 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import CursorPaginator
+from posts.views import AMOUNT_POST, comments_paginator, follow_posts
+
+User = get_user_model()
+
+# Слияние постов многих авторов требует сортировки; без неё ленту
+# подписок отдают предсобранные ленты (POSTS_TIMELINES).
+EXPECTED_SORTS = {'follow_index'}
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию с тестовыми данными."""
+
+
+def bad_plan(plan):
+    """Возвращает причину, если план запроса сканирует таблицу или
+    сортирует результат во временной структуре."""
+    lines = plan.splitlines()
+    if connection.vendor == 'sqlite':
+        for line in lines:
+            if 'TEMP B-TREE' in line:
+                return line.strip()
+            if 'SCAN' in line and 'INDEX' not in line:
+                return line.strip()
+    elif connection.vendor == 'postgresql':
+        for line in lines:
+            if 'Seq Scan' in line or line.strip().startswith('Sort'):
+                return line.strip()
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД тестовыми данными в откатываемой транзакции '
+            'и проверяет через EXPLAIN, что запросы лент идут по индексам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def seed(self, options):
+        rnd = random.Random(options['seed'])
+        User.objects.bulk_create(
+            (User(username=f'bench-{i}') for i in range(options['users']))
+        )
+        Group.objects.bulk_create(
+            (Group(title=f'bench-{i}', slug=f'bench-{i}')
+             for i in range(options['groups']))
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith='bench-'
+        ).values_list('id', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith='bench-'
+        ).values_list('id', flat=True))
+        Post.objects.bulk_create(
+            (Post(text=f'bench {i}', author_id=rnd.choice(user_ids),
+                  group_id=rnd.choice(group_ids + [None]))
+             for i in range(options['posts']))
+        )
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            (Comment(text=f'bench {i}', author_id=rnd.choice(user_ids),
+                     post_id=rnd.choice(post_ids))
+             for i in range(options['comments']))
+        )
+        follows = {
+            (user_id, author_id)
+            for user_id in user_ids
+            for author_id in rnd.sample(
+                user_ids, min(options['follows'], len(user_ids))
+            )
+            if user_id != author_id
+        }
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in follows)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return user_ids, group_ids, post_ids
+
+    def feed_queries(self, user_ids, group_ids, post_ids):
+        """Запросы страниц лент, построенные теми же функциями, что
+        и в posts.views: с OFFSET, по курсору и по курсору со второй
+        страницы."""
+        user = User.objects.get(pk=user_ids[0])
+        group = Group.objects.get(pk=group_ids[0])
+        post = Comment.objects.values_list('post', flat=True).first()
+        post = Post.objects.get(pk=post or post_ids[-1])
+        feeds = {
+            'index': Post.objects.for_feed(),
+            'group_posts': group.posts.for_feed(),
+            'profile': user.posts.for_feed(),
+            'follow_index': follow_posts(user),
+        }
+        queries = {}
+        for name, posts in feeds.items():
+            queries[name] = posts[:AMOUNT_POST]
+            queries.update(self.keyset_queries(
+                name, CursorPaginator(posts, AMOUNT_POST)
+            ))
+        queries.update(self.keyset_queries(
+            'post_detail comments', comments_paginator(post)
+        ))
+        return queries
+
+    def keyset_queries(self, name, paginator):
+        queries = {f'{name} cursor': paginator.page_queryset()}
+        rows = paginator.get_page().object_list
+        if rows:
+            queries[f'{name} cursor next'] = paginator.page_queryset(
+                paginator.encode_cursor('next', rows[-1])
+            )
+        return queries
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                ids = self.seed(options)
+                self.stdout.write(
+                    f'Данные созданы за {time.perf_counter() - started:.1f} с'
+                )
+                for name, page in self.feed_queries(*ids).items():
+                    started = time.perf_counter()
+                    list(page)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    reason = bad_plan(page.explain())
+                    if reason is None:
+                        status = 'OK'
+                    elif name.split()[0] in EXPECTED_SORTS:
+                        status = f'WARN: {reason}'
+                    else:
+                        status = f'FAIL: {reason}'
+                        failures.append(name)
+                    self.stdout.write(f'{name:32} {elapsed:8.2f} мс  {status}')
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError(
+                'Запросы без индекса или с сортировкой: ' + ', '.join(failures)
+            )
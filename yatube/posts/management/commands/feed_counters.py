@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики лент (FeedCounter); '
+            'с --check сверяет сохранённые счётчики с COUNT(*).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить счётчики и вывести расхождения.'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Вместе с --check перезаписать расходящиеся счётчики.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            total = counters.rebuild()
+            self.stdout.write(f'Пересчитано счётчиков: {total}')
+            return
+        problems = counters.check(fix=options['fix'])
+        for key, stored, actual in problems:
+            self.stdout.write(
+                f'{key}: сохранено {stored}, на самом деле {actual}'
+            )
+        if not problems:
+            self.stdout.write('Счётчики лент согласованы.')
+        elif options['fix']:
+            self.stdout.write(f'Исправлено расхождений: {len(problems)}')
+        else:
+            raise CommandError(f'Расхождений: {len(problems)}')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «на кого подписаться» для '
+            'пользователей из очереди изменений графа подписок. С --loop '
+            'работает фоновым обработчиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Поставить в очередь всех пользователей.'
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, ждать новых изменений.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Пауза между проверками очереди в режиме --loop, с.'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            suggestions.enqueue(User.objects.values_list('pk', flat=True))
+        total = 0
+        while True:
+            done = suggestions.process(options['batch_size'])
+            total += done
+            if done:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'Пересчитано пользователей: {total}')
@@ -0,0 +1,199 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.streaming import chunks
+from posts import author_stats, counters, feed_cache, search, timelines
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                yield number, error
+
+
+def read_csv(stream):
+    for number, row in enumerate(csv.DictReader(stream), 2):
+        yield number, row
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+@contextmanager
+def keep_pub_date():
+    """Сохраняет даты из архива: bulk_create иначе ставит текущую."""
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из JSONL или CSV пачками через bulk_create. '
+            'Поля записи: text, author (username), group (slug), '
+            'pub_date (ISO 8601), image (путь относительно --images).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или «-» для stdin.')
+        parser.add_argument('--format', choices=READERS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать неизвестных авторов без пароля.'
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать неизвестные группы по slug.'
+        )
+        parser.add_argument(
+            '--images', type=Path,
+            help='Каталог с картинками; без него поле image игнорируется.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        self.options = options
+        self.authors = {}
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.skipped = 0
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        started = time.monotonic()
+        imported = 0
+        touched_groups = set()
+        stream = sys.stdin if path == '-' else open(
+            path, encoding='utf-8', newline=''
+        )
+        with stream, keep_pub_date():
+            records = READERS[fmt](stream)
+            for batch in chunks(records, options['batch_size']):
+                posts = self.build_posts(batch)
+                with transaction.atomic():
+                    Post.objects.bulk_create(posts)
+                    author_stats.refresh({post.author_id for post in posts})
+                imported += len(posts)
+                touched_groups.update(post.group_id for post in posts)
+                if timelines.enabled():
+                    timelines.invalidate({post.author_id for post in posts})
+                self.report(imported, started, final=False)
+        counters.reset()
+        feed_cache.bump('index', *(
+            f'group:{group_id}' for group_id in touched_groups if group_id
+        ))
+        search.index_posts(Post.objects.filter(pk__gt=last_pk))
+        self.report(imported, started, final=True)
+
+    def report(self, imported, started, final):
+        if not final and self.options['verbosity'] < 2:
+            return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'Загружено постов: {imported}, пропущено: {self.skipped}, '
+            f'{imported / elapsed:.0f} строк/с'
+        )
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Строка {number}: {reason}')
+
+    def resolve_authors(self, usernames):
+        missing = usernames - self.authors.keys()
+        if not missing:
+            return
+        self.authors.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'pk')
+        )
+        missing -= self.authors.keys()
+        if missing and self.options['create_authors']:
+            User.objects.bulk_create(
+                User(username=username, password=make_password(None))
+                for username in missing
+            )
+            self.authors.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+
+    def resolve_group(self, slug):
+        if slug not in self.groups and self.options['create_groups']:
+            group, _ = Group.objects.get_or_create(
+                slug=slug, defaults={'title': slug}
+            )
+            self.groups[slug] = group.pk
+        return self.groups.get(slug)
+
+    def attach_image(self, post, name):
+        source = self.options['images'] / name
+        if not source.is_file():
+            raise ValueError(f'нет картинки {source}')
+        field = Post._meta.get_field('image')
+        with source.open('rb') as image:
+            post.image = field.storage.save(
+                field.generate_filename(post, source.name), File(image)
+            )
+
+    def build_post(self, record):
+        """Пост из записи архива; ValueError — причина пропуска."""
+        text = record.get('text')
+        author_id = self.authors.get(record.get('author'))
+        if not text or author_id is None:
+            raise ValueError('нет текста или неизвестный автор')
+        group_id = None
+        if record.get('group'):
+            group_id = self.resolve_group(record['group'])
+            if group_id is None:
+                raise ValueError(f'неизвестная группа {record["group"]}')
+        pub_date = timezone.now()
+        if record.get('pub_date'):
+            pub_date = parse_datetime(record['pub_date'])
+            if pub_date is None:
+                raise ValueError(f'неверная дата {record["pub_date"]}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        post = Post(
+            text=text, author_id=author_id, group_id=group_id,
+            pub_date=pub_date
+        )
+        if record.get('image') and self.options['images']:
+            self.attach_image(post, record['image'])
+        return post
+
+    def build_posts(self, batch):
+        self.resolve_authors({
+            record.get('author') for _, record in batch
+            if isinstance(record, dict) and record.get('author')
+        })
+        posts = []
+        for number, record in batch:
+            if not isinstance(record, dict):
+                self.skip(number, f'не разобрана: {record}')
+                continue
+            try:
+                posts.append(self.build_post(record))
+            except ValueError as error:
+                self.skip(number, error)
+        return posts
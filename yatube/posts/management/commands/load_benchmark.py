@@ -0,0 +1,415 @@
+import json
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from mixer.backend.django import mixer
+
+from about import urls as about_urls
+from core.streaming import chunks
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post
+from users import urls as users_urls
+
+User = get_user_model()
+
+PREFIX = 'load-'
+PASSWORD = 'load-benchmark'
+PERCENTILES = (50, 95, 99)
+IN_CHUNK = 500
+
+
+def url_names():
+    """Имена всех маршрутов posts, users и about."""
+    return {
+        f'{module.app_name}:{pattern.name}'
+        for module in (posts_urls, users_urls, about_urls)
+        for pattern in module.urlpatterns
+        if pattern.name
+    }
+
+
+def percentile(values, q):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(samples, elapsed=None):
+    times = sorted(sample[0] for sample in samples)
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample[2]),
+        'queries': (
+            round(sum(sample[1] for sample in samples) / len(samples), 2)
+            if samples else None
+        ),
+    }
+    for q in PERCENTILES:
+        value = percentile(times, q)
+        summary[f'p{q}_ms'] = None if value is None else round(value, 3)
+    if elapsed is not None:
+        summary['seconds'] = round(elapsed, 3)
+        summary['rps'] = round(len(samples) / max(elapsed, 1e-6), 1)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД данными через mixer/Faker и нагружает все '
+            'маршруты posts, users и about из нескольких потоков: '
+            'p50/p95/p99, запросы в секунду и SQL-запросы на запрос. '
+            'Данные удаляются после прогона, если не указан --keep.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=1000)
+        parser.add_argument(
+            '--follows', type=int, default=5,
+            help='Подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на каждый маршрут.'
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--routes', nargs='+', metavar='NAME',
+            help='Только эти маршруты, например posts:index.'
+        )
+        parser.add_argument('--json', type=Path, help='Куда сохранить итог.')
+        parser.add_argument(
+            '--compare', type=Path,
+            help='JSON прошлого прогона: показать изменение p95.'
+        )
+        parser.add_argument('--keep', action='store_true')
+
+    def seed(self, options):
+        """Данные прогона; у всех пользователей и групп префикс PREFIX."""
+        rnd = random.Random(options['seed'])
+        random.seed(options['seed'])
+        mixer.faker.seed_instance(options['seed'])
+        users = mixer.cycle(options['users']).blend(
+            User, username=mixer.sequence(PREFIX + '{0}')
+        )
+        password = make_password(PASSWORD)
+        for user in users:
+            user.password = password
+        User.objects.bulk_update(users, ['password'])
+        groups = mixer.cycle(options['groups']).blend(
+            Group, slug=mixer.sequence(PREFIX + '{0}')
+        )
+        posts = mixer.cycle(options['posts']).blend(
+            Post, text=mixer.faker.paragraph,
+            author=(rnd.choice(users) for _ in range(options['posts'])),
+            group=(rnd.choice(groups + [None])
+                   for _ in range(options['posts'])),
+        )
+        mixer.cycle(options['comments']).blend(
+            Comment, text=mixer.faker.sentence,
+            author=(rnd.choice(users) for _ in range(options['comments'])),
+            post=(rnd.choice(posts) for _ in range(options['comments'])),
+        )
+        follows = sorted({
+            (user.pk, author.pk)
+            for user in users
+            for author in rnd.sample(users, min(options['follows'],
+                                                len(users)))
+            if user != author
+        })
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follows
+        )
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.posts_by_author = {}
+        for post in posts:
+            self.posts_by_author.setdefault(post.author_id, []).append(post)
+        self.signups = count()
+
+    def check_database(self):
+        """Отказывается работать с БД, где уже есть данные с PREFIX:
+        сид столкнулся бы с ними, а это могут быть настоящие аккаунты."""
+        if (User.objects.filter(username__startswith=PREFIX).exists()
+                or Group.objects.filter(slug__startswith=PREFIX).exists()):
+            raise CommandError(
+                f'В БД уже есть пользователи или группы с префиксом '
+                f'{PREFIX}: запустите прогон на отдельной БД или удалите '
+                f'данные прошлого прогона с --keep.'
+            )
+
+    def cleanup(self):
+        """Удаляет только созданное прогоном: пользователей и группы
+        сида и зарегистрированных в нём; посты, комментарии и подписки
+        удаляются каскадом."""
+        for part in chunks([user.pk for user in self.users], IN_CHUNK):
+            User.objects.filter(pk__in=part).delete()
+        for part in chunks(self.signup_names, IN_CHUNK):
+            User.objects.filter(username__in=part).delete()
+        for part in chunks([group.pk for group in self.groups], IN_CHUNK):
+            Group.objects.filter(pk__in=part).delete()
+
+    def routes(self):
+        """Имя маршрута -> функция (rnd, user) -> (метод, url, данные,
+        клиент). Клиент: anon, user или fresh — новый вошедший клиент
+        для запросов, которые меняют сессию."""
+        def post(rnd, user):
+            return rnd.choice(self.posts).pk
+
+        def other(rnd, user):
+            return rnd.choice(self.users).username
+
+        def own_post(rnd, user):
+            return rnd.choice(self.posts_by_author[user.pk]).pk
+
+        def reset_link(rnd, user):
+            return reverse('users:password_reset_confirm', kwargs={
+                'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+                'token': default_token_generator.make_token(user),
+            })
+
+        def signup(rnd, user):
+            name = f'{PREFIX}signup-{next(self.signups)}'
+            self.signup_names.append(name)
+            return {
+                'username': name, 'email': f'{name}@example.com',
+                'password1': PASSWORD + '!', 'password2': PASSWORD + '!',
+            }
+
+        def get(name, client='anon', **kwargs):
+            return lambda rnd, user: ('get', reverse(name, kwargs={
+                key: value(rnd, user) for key, value in kwargs.items()
+            }), None, client)
+
+        return {
+            'posts:index': get('posts:index'),
+            'posts:group_list': lambda rnd, user: (
+                'get', reverse('posts:group_list',
+                               args=[rnd.choice(self.groups).slug]),
+                None, 'anon'
+            ),
+            'posts:profile': get('posts:profile', username=other),
+            'posts:post_detail': get('posts:post_detail', post_id=post),
+            'posts:comment_list': get('posts:comment_list', post_id=post),
+            'posts:search': lambda rnd, user: (
+                'get', reverse('posts:search'),
+                {'q': rnd.choice(self.posts).text.split()[0]}, 'anon'
+            ),
+            'posts:follow_index': get('posts:follow_index', 'user'),
+            'posts:post_create': lambda rnd, user: (
+                'post', reverse('posts:post_create'),
+                {'text': mixer.faker.paragraph()}, 'user'
+            ),
+            'posts:post_edit': lambda rnd, user: (
+                'post', reverse('posts:post_edit', args=[own_post(rnd, user)]),
+                {'text': mixer.faker.paragraph()}, 'user'
+            ),
+            'posts:add_comment': lambda rnd, user: (
+                'post', reverse('posts:add_comment', args=[post(rnd, user)]),
+                {'text': mixer.faker.sentence()}, 'user'
+            ),
+            'posts:profile_follow': get(
+                'posts:profile_follow', 'user', username=other
+            ),
+            'posts:profile_unfollow': get(
+                'posts:profile_unfollow', 'user', username=other
+            ),
+            'users:signup': lambda rnd, user: (
+                'post', reverse('users:signup'), signup(rnd, user), 'anon'
+            ),
+            'users:login': lambda rnd, user: (
+                'post', reverse('users:login'),
+                {'username': user.username, 'password': PASSWORD}, 'fresh'
+            ),
+            'users:logout': get('users:logout', 'fresh'),
+            'users:password_change': get('users:password_change', 'user'),
+            'users:password_change_done': get(
+                'users:password_change_done', 'user'
+            ),
+            'users:password_reset_form': lambda rnd, user: (
+                'post', reverse('users:password_reset_form'),
+                {'email': user.email}, 'anon'
+            ),
+            'users:password_reset_done': get('users:password_reset_done'),
+            'users:password_reset_confirm': lambda rnd, user: (
+                'get', reset_link(rnd, user), None, 'anon'
+            ),
+            'users:password_reset_complete': get(
+                'users:password_reset_complete'
+            ),
+            'about:author': get('about:author'),
+            'about:tech': get('about:tech'),
+        }
+
+    def worker(self, index, jobs):
+        """Выполняет свою часть запросов; возвращает (маршрут, мс,
+        SQL-запросов, успех)."""
+        rnd = random.Random(self.options['seed'] + index)
+        user = rnd.choice([
+            user for user in self.users if user.pk in self.posts_by_author
+        ])
+        clients = {'anon': Client(), 'user': Client()}
+        clients['user'].force_login(user)
+        samples = []
+        try:
+            for name in jobs:
+                method, url, data, kind = self.plans[name](rnd, user)
+                client = clients.get(kind)
+                if client is None:
+                    client = Client()
+                    client.force_login(user)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    try:
+                        ok = getattr(client, method)(url, data).status_code
+                        ok = ok < 500
+                    except Exception:
+                        ok = False
+                    elapsed = (time.perf_counter() - started) * 1000
+                samples.append((name, elapsed, len(queries), ok))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        return samples
+
+    def run(self, names):
+        jobs = [
+            name for name in names for _ in range(self.options['requests'])
+        ]
+        random.Random(self.options['seed']).shuffle(jobs)
+        concurrency = max(1, self.options['concurrency'])
+        slices = [jobs[index::concurrency] for index in range(concurrency)]
+        started = time.perf_counter()
+        if concurrency == 1:
+            results = [self.worker(0, slices[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(self.worker, range(concurrency),
+                                        slices))
+        return (
+            [sample for result in results for sample in result],
+            time.perf_counter() - started,
+        )
+
+    def report(self, names, samples, elapsed):
+        by_route = {name: [] for name in names}
+        for name, *sample in samples:
+            by_route[name].append(sample)
+        return {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(),
+            'options': {
+                key: self.options[key] for key in (
+                    'users', 'groups', 'posts', 'comments', 'follows',
+                    'requests', 'concurrency', 'seed'
+                )
+            },
+            'total': summarize([
+                sample for route in by_route.values() for sample in route
+            ], elapsed),
+            'routes': {
+                name: summarize(route) for name, route in by_route.items()
+            },
+        }
+
+    def write_report(self, report, baseline):
+        header = (f'{"маршрут":32} {"запр.":>6} {"ошиб.":>6} {"p50":>8} '
+                  f'{"p95":>8} {"p99":>8} {"SQL":>6}')
+        if baseline:
+            header += f' {"Δp95":>8}'
+        self.stdout.write(header)
+        rows = dict(report['routes'], **{'ВСЕГО': report['total']})
+        for name, row in rows.items():
+            line = (f'{name:32} {row["requests"]:6} {row["errors"]:6} '
+                    f'{row["p50_ms"]:8.2f} {row["p95_ms"]:8.2f} '
+                    f'{row["p99_ms"]:8.2f} {row["queries"]:6.1f}')
+            before = baseline.get(name, {}).get('p95_ms')
+            if before:
+                line += f' {(row["p95_ms"] / before - 1) * 100:+7.1f}%'
+            self.stdout.write(line)
+        self.stdout.write(
+            f'{report["total"]["rps"]} запросов/с за '
+            f'{report["total"]["seconds"]} с'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.users, self.groups, self.signup_names = [], [], []
+        self.plans = self.routes()
+        missing = url_names() - self.plans.keys()
+        if missing:
+            raise CommandError(
+                'Нет сценария для маршрутов: ' + ', '.join(sorted(missing))
+            )
+        names = sorted(options['routes'] or self.plans)
+        unknown = set(names) - self.plans.keys()
+        if unknown:
+            raise CommandError(
+                'Неизвестные маршруты: ' + ', '.join(sorted(unknown))
+            )
+        if options['requests'] < 1 or options['users'] < 2:
+            raise CommandError('Нужны --requests >= 1 и --users >= 2')
+        baseline = {}
+        if options['compare']:
+            previous = json.loads(options['compare'].read_text())
+            baseline = dict(previous['routes'], ВСЕГО=previous['total'])
+        self.check_database()
+        hosts = settings.ALLOWED_HOSTS + ['testserver']
+        with override_settings(
+            ALLOWED_HOSTS=hosts,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            try:
+                started = time.perf_counter()
+                with transaction.atomic():
+                    self.seed(options)
+                self.stdout.write(
+                    f'Данные созданы за {time.perf_counter() - started:.1f} с'
+                )
+                samples, elapsed = self.run(names)
+            finally:
+                if not options['keep']:
+                    self.cleanup()
+        report = self.report(names, samples, elapsed)
+        self.write_report(report, baseline)
+        if options['json']:
+            options['json'].write_text(
+                json.dumps(report, indent=2, ensure_ascii=False)
+            )
+        if report['total']['errors']:
+            self.stderr.write(
+                f'Ошибок: {report["total"]["errors"]} '
+                '(ответы 5xx или исключения)'
+            )
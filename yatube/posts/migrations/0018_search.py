@@ -0,0 +1,86 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:23
+
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копии posts.search на момент миграции: её результат не должен
+# меняться вместе с кодом поиска
+FTS_TABLE = 'posts_post_fts'
+MAX_TERM_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [
+        word.replace('ё', 'е')[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+    ]
+
+
+def fts5_available(db):
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    """Создаёт таблицу FTS5 (если SQLite её умеет) и индексирует
+    уже написанные посты в активном бэкенде поиска."""
+    db = schema_editor.connection
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    posts = Post.objects.using(db.alias).values_list('pk', 'text')
+    available = fts5_available(db)
+    if available:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+            f"USING fts5(text, tokenize='unicode61')"
+        )
+    backend = settings.POSTS_SEARCH_BACKEND
+    use_fts = available if backend == 'auto' else backend == 'fts5'
+    if use_fts:
+        with db.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [(pk, ' '.join(tokenize(text))) for pk, text in posts]
+            )
+        return
+    SearchTerm.objects.using(db.alias).bulk_create(
+        SearchTerm(post_id=pk, term=term, count=count)
+        for pk, text in posts
+        for term, count in Counter(tokenize(text)).items()
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
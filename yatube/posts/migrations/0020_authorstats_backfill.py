@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max
+
+BATCH_SIZE = 500
+
+
+def grouped(queryset, field, **aggregates):
+    return {
+        row.pop(field): row
+        for row in queryset.values(field).annotate(**aggregates).order_by()
+    }
+
+
+def backfill(apps, schema_editor):
+    """Сводки для всех пользователей, как author_stats.rebuild, но без
+    перезаписи уже существующих строк."""
+    database = schema_editor.connection.alias
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    aggregates = (
+        grouped(Post.objects.using(database), 'author',
+                posts_count=Count('pk'), last_post_date=Max('pub_date')),
+        grouped(Follow.objects.using(database), 'author',
+                followers_count=Count('pk')),
+        grouped(Follow.objects.using(database), 'user',
+                following_count=Count('pk')),
+        grouped(Comment.objects.using(database), 'author',
+                comments_count=Count('pk')),
+    )
+    stats = []
+    for pk in User.objects.using(database).values_list('pk', flat=True):
+        row = AuthorStats(author_id=pk)
+        for values in aggregates:
+            for field, value in values.get(pk, {}).items():
+                setattr(row, field, value)
+        stats.append(row)
+    AuthorStats.objects.using(database).bulk_create(
+        stats, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0019_suggestions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,14 @@ from django.db import models
 User = get_user_model()
 
 LENGTH_TEXT = 15
+# Поля, не нужные карточке поста в лентах
+FEED_DEFERRED_FIELDS = (
+    'group__description',
+    'author__password',
+    'author__email',
+    'author__last_login',
+    'author__date_joined',
+)
 
 
 class Group(models.Model):
@@ -16,6 +24,14 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа в одном запросе."""
+        return self.select_related('author', 'group').defer(
+            *FEED_DEFERRED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(
@@ -44,10 +60,22 @@ class Post(models.Model):
         null=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -75,6 +103,15 @@ class Comment(models.Model):
 
     )
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text[:LENGTH_TEXT]
 
@@ -93,3 +130,102 @@ class Follow(models.Model):
         verbose_name='Автор',
         help_text='Имя автора'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация «на кого подписаться» (posts.suggestions)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField()
+    # Сколько подписок пользователя читают автора
+    mutual = models.PositiveIntegerField(default=0)
+    # Сколько читателей тех же авторов подписаны и на этого
+    co_follow = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-score', 'author']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow_suggestion'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}: {self.score}'
+
+
+class SuggestionQueue(models.Model):
+    """Пользователи, чьи рекомендации надо пересчитать."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    queued = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class FeedCounter(models.Model):
+    """Поддерживаемый сигналами счётчик строк для лент и профилей."""
+    key = models.CharField(max_length=64, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
+
+
+class AuthorStats(models.Model):
+    """Сводка по автору, поддерживаемая сигналами (posts.author_stats)."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    last_post_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.author_id}: {self.posts_count} постов'
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса поиска (posts.search)."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'], name='unique_search_term'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.term}: {self.post_id}'
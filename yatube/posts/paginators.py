@@ -0,0 +1,150 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class CursorPage(Page):
+    """Страница курсорной паджинации."""
+
+    def __init__(self, object_list, number, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (key, pk) без COUNT(*) и OFFSET.
+
+    Страница выбирается условием по последней показанной записи,
+    поэтому стоимость запроса не зависит от глубины страницы.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, per_page, key='pub_date',
+                 descending=True):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.descending = descending
+
+    def encode_cursor(self, direction, obj):
+        field = self.object_list.model._meta.get_field(self.key)
+        value = field.value_to_string(obj)
+        raw = json.dumps([direction, value, obj.pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, value, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev'):
+            raise ValueError('Неизвестное направление курсора.')
+        field = self.object_list.model._meta.get_field(self.key)
+        value = field.to_python(value)
+        if value is None or pk is None:
+            raise ValueError('Пустое значение в курсоре.')
+        return direction, value, int(pk)
+
+    def _ordering(self, forward):
+        prefix = '-' if self.descending == forward else ''
+        return prefix + self.key, prefix + 'pk'
+
+    def _after(self, value, pk, forward):
+        lookup = 'lt' if self.descending == forward else 'gt'
+        # Условие по одному key позволяет идти по его индексу диапазоном
+        return Q(**{f'{self.key}__{lookup}e': value}) & (
+            Q(**{f'{self.key}__{lookup}': value})
+            | Q(**{f'pk__{lookup}': pk})
+        )
+
+    def _select(self, cursor):
+        direction = None
+        if cursor:
+            try:
+                direction, value, pk = self.decode_cursor(cursor)
+            except (ValueError, TypeError, LookupError, ValidationError):
+                direction = None
+        forward = direction != 'prev'
+        queryset = self.object_list.order_by(*self._ordering(forward))
+        if direction is not None:
+            queryset = queryset.filter(self._after(value, pk, forward))
+        return direction, forward, queryset[:self.per_page + 1]
+
+    def page_queryset(self, cursor=None):
+        """Запрос строк страницы (на одну больше per_page), например
+        для EXPLAIN."""
+        return self._select(cursor)[2]
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору; битый курсор — первая страница."""
+        direction, forward, queryset = self._select(cursor)
+        rows = list(queryset)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        has_next = has_more if forward else True
+        has_previous = direction is not None if forward else has_more
+        return CursorPage(
+            rows,
+            cursor or 1,
+            self,
+            next_cursor=(
+                self.encode_cursor('next', rows[-1])
+                if rows and has_next else None
+            ),
+            previous_cursor=(
+                self.encode_cursor('prev', rows[0])
+                if rows and has_previous else None
+            ),
+        )
+
+    def stream_page(self, cursor=None, chunk_size=100):
+        """Страница, строки которой читаются серверным курсором БД.
+
+        object_list — генератор; курсоры соседних страниц известны
+        после того, как он пройден. Страница «назад» выбирается
+        обычным get_page: её строки нужно развернуть.
+        """
+        direction, forward, queryset = self._select(cursor)
+        if not forward:
+            return self.get_page(cursor)
+        page = CursorPage((), cursor or 1, self)
+
+        def rows():
+            last = None
+            for index, row in enumerate(queryset.iterator(chunk_size)):
+                if index == self.per_page:
+                    page.next_cursor = self.encode_cursor('next', last)
+                    return
+                if index == 0 and direction is not None:
+                    page.previous_cursor = self.encode_cursor('prev', row)
+                last = row
+                yield row
+
+        page.object_list = rows()
+        return page
+
+    page = get_page
+
+
+class CountedPaginator(Paginator):
+    """Паджинатор, берущий число записей из счётчика, а не COUNT(*)."""
+
+    def __init__(self, object_list, per_page, counter):
+        super().__init__(object_list, per_page)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        return self.counter()
@@ -0,0 +1,211 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from core.streaming import chunks
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERM_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+
+_fts5 = {}
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, «ё» приравнена к «е»."""
+    return [
+        word.replace('ё', 'е')[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+    ]
+
+
+def fts5_available(db=connection):
+    """Собран ли SQLite текущего соединения с FTS5."""
+    if db.vendor != 'sqlite':
+        return False
+    if db.alias not in _fts5:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            _fts5[db.alias] = bool(cursor.fetchone()[0])
+    return _fts5[db.alias]
+
+
+def fts_enabled():
+    """Индекс FTS5 при POSTS_SEARCH_BACKEND = 'auto' на SQLite с FTS5
+    или 'fts5'; иначе — таблица SearchTerm с ранжированием в Python."""
+    backend = settings.POSTS_SEARCH_BACKEND
+    if backend == 'auto':
+        return fts5_available()
+    return backend == 'fts5'
+
+
+def _match(terms):
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _terms(posts):
+    return [
+        SearchTerm(post_id=pk, term=term, count=count)
+        for pk, text in posts
+        for term, count in Counter(tokenize(text)).items()
+    ]
+
+
+def index_post(post):
+    """Заносит текст поста в индекс вместо прежнего."""
+    remove_post(post.pk)
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, ' '.join(tokenize(post.text))]
+            )
+    else:
+        SearchTerm.objects.bulk_create(_terms([(post.pk, post.text)]))
+
+
+def remove_post(post_id):
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+    else:
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+
+def _write(posts, batch_size):
+    """Заносит пары (pk, text) в индекс пачками; возвращает их число."""
+    total = 0
+    fts = fts_enabled()
+    with connection.cursor() as cursor:
+        for batch in chunks(posts, batch_size):
+            if fts:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                    [(pk, ' '.join(tokenize(text))) for pk, text in batch]
+                )
+            else:
+                SearchTerm.objects.bulk_create(_terms(batch))
+            total += len(batch)
+    return total
+
+
+def index_posts(posts, batch_size=1000):
+    """Индексирует ещё не проиндексированные посты из queryset,
+    например загруженные bulk_create мимо сигналов."""
+    return _write(
+        posts.values_list('pk', 'text').order_by().iterator(batch_size),
+        batch_size
+    )
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс активного бэкенда заново; возвращает число постов.
+
+    Нужен после смены POSTS_SEARCH_BACKEND.
+    """
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        SearchTerm.objects.all().delete()
+    return index_posts(Post.objects.all(), batch_size)
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в queryset постов только найденные, не ранжируя."""
+    terms = set(tokenize(query))
+    if not terms:
+        return queryset.none()
+    if fts_enabled():
+        # RawSQL в pk__in оборачивается во вторые скобки, и SQLite
+        # сравнивает id только с первой строкой подзапроса
+        pk = connection.ops.quote_name(Post._meta.db_table) + '.id'
+        return queryset.extra(
+            where=[f'{pk} IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[_match(terms)]
+        )
+    return queryset.filter(pk__in=(
+        SearchTerm.objects.filter(term__in=terms)
+        .values('post').annotate(found=Count('term'))
+        .filter(found=len(terms)).values('post')
+    ))
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности.
+
+    Поддерживает count() и срезы, поэтому передаётся в Paginator.
+    FTS5 ранжирует по bm25 и отдаёт срез запросом с LIMIT; резервный
+    индекс считает TF-IDF по всем совпадениям в Python.
+    """
+
+    def __init__(self, query, posts=None):
+        self.terms = sorted(set(tokenize(query)))
+        self.posts = Post.objects.for_feed() if posts is None else posts
+        self._ranked = None
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s', [_match(self.terms)]
+                )
+                return cursor.fetchone()[0]
+        return len(self._python_ranked())
+
+    def _python_ranked(self):
+        if self._ranked is None:
+            postings = {}
+            for term, post_id, count in SearchTerm.objects.filter(
+                term__in=self.terms
+            ).values_list('term', 'post_id', 'count'):
+                postings.setdefault(term, {})[post_id] = count
+            scores = {}
+            if len(postings) == len(self.terms):
+                total = Post.objects.count()
+                common = set.intersection(
+                    *(set(posts) for posts in postings.values())
+                )
+                for posts in postings.values():
+                    idf = math.log(1 + total / len(posts))
+                    for post_id in common:
+                        scores[post_id] = scores.get(post_id, 0) + (
+                            (1 + math.log(posts[post_id])) * idf
+                        )
+            self._ranked = sorted(
+                scores, key=lambda post_id: (-scores[post_id], -post_id)
+            )
+        return self._ranked
+
+    def _ids(self, start, stop):
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+                    f'MATCH %s ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                    [_match(self.terms), stop - start, start]
+                )
+                return [row[0] for row in cursor.fetchall()]
+        return self._python_ranked()[start:stop]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.terms or stop <= start:
+            return []
+        ids = self._ids(start, stop)
+        found = self.posts.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
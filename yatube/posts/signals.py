@@ -0,0 +1,164 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    author_stats, counters, feed_cache, follow_graph, fragments, search,
+    suggestions, timelines
+)
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_relations(sender, instance, **kwargs):
+    """Запоминает прежние группу, автора и текст редактируемого поста."""
+    instance._previous_relations = None
+    instance._previous_text = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'author_id', 'text'
+        ).first()
+        if previous is not None:
+            instance._previous_relations = previous[:2]
+            instance._previous_text = previous[2]
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(counters.POSTS_KEY, 1)
+        author_stats.post_added(instance)
+        if instance.group_id:
+            counters.bump(counters.group_key(instance.group_id), 1)
+        if timelines.enabled():
+            transaction.on_commit(partial(timelines.push, instance))
+        return
+    fragments.bump('post', instance.pk)
+    previous = getattr(instance, '_previous_relations', None)
+    if previous is None:
+        return
+    group_id, author_id = previous
+    if group_id != instance.group_id:
+        if group_id:
+            counters.bump(counters.group_key(group_id), -1)
+        if instance.group_id:
+            counters.bump(counters.group_key(instance.group_id), 1)
+    if author_id != instance.author_id:
+        author_stats.post_removed(author_id)
+        author_stats.post_added(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump(counters.POSTS_KEY, -1)
+    author_stats.post_removed(instance.author_id)
+    if instance.group_id:
+        counters.bump(counters.group_key(instance.group_id), -1)
+    if timelines.enabled():
+        transaction.on_commit(partial(
+            timelines.remove, instance.author_id, instance.pk
+        ))
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, **kwargs):
+    if created or instance.text != getattr(instance, '_previous_text', None):
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def reset_feed_pages(sender, instance, **kwargs):
+    scopes = {'index', f'group:{instance.group_id}'}
+    previous = getattr(instance, '_previous_relations', None)
+    if previous is not None:
+        scopes.add(f'group:{previous[0]}')
+    feed_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        author_stats.bump(instance.author_id, followers_count=1)
+        author_stats.bump(instance.user_id, following_count=1)
+        if follow_graph.enabled():
+            transaction.on_commit(partial(
+                follow_graph.add, instance.user, instance.author_id
+            ))
+        if timelines.enabled():
+            transaction.on_commit(partial(
+                timelines.backfill, instance.user_id, instance.author_id
+            ))
+        transaction.on_commit(partial(
+            suggestions.mark_stale, instance.user_id, instance.author_id
+        ))
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    author_stats.bump(instance.author_id, followers_count=-1)
+    author_stats.bump(instance.user_id, following_count=-1)
+    if follow_graph.enabled():
+        user = User.objects.filter(pk=instance.user_id).first()
+        if user is not None:
+            transaction.on_commit(partial(
+                follow_graph.remove, user, instance.author_id
+            ))
+    if timelines.enabled():
+        transaction.on_commit(partial(
+            timelines.prune, instance.user_id, instance.author_id
+        ))
+    # После фиксации: при удалении пользователя его строка очереди
+    # иначе пережила бы каскад
+    transaction.on_commit(partial(
+        suggestions.mark_stale, instance.user_id, instance.author_id
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        author_stats.bump(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    author_stats.bump(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        author_stats.create(instance)
+
+
+@receiver(post_save, sender=User)
+def reset_author_cards(sender, instance, created, update_fields=None,
+                       **kwargs):
+    """Страницы лент хранят посты вместе с автором, поэтому сбрасываются
+    главная и группы, где он публиковался."""
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    fragments.bump('user', instance.pk)
+    group_ids = Post.objects.filter(author=instance).exclude(
+        group=None
+    ).values_list('group_id', flat=True).distinct()
+    feed_cache.bump('index', *(f'group:{pk}' for pk in group_ids))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reset_group_cards(sender, instance, created=False, **kwargs):
+    if not created:
+        fragments.bump('group', instance.pk)
+        feed_cache.bump('index', f'group:{instance.pk}')
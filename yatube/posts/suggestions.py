@@ -0,0 +1,231 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from core.streaming import chunks
+
+from . import follow_graph
+from .models import Follow, FollowSuggestion, SuggestionQueue, User
+
+# Вес общей подписки против совпадения вкусов с другим читателем
+MUTUAL_WEIGHT = 2
+IN_CHUNK = 500
+
+
+def key(user):
+    # Дата регистрации в ключе — по той же причине, что в follow_graph
+    return f'suggestions:{user.pk}:{user.date_joined.timestamp():.6f}'
+
+
+def _stored(user):
+    return FollowSuggestion.objects.filter(user=user).values(
+        'author_id', 'mutual', 'co_follow', username=F('author__username'),
+    )
+
+
+def for_user(user, exclude=None, followed=None):
+    """Рекомендации для показа: словари с author_id, username,
+    mutual и co_follow.
+
+    followed — уже прочитанные follow_graph.following(user), если они
+    есть у представления: авторы, на которых пользователь подписан,
+    отсеиваются по ним. Без запросов к БД рекомендации отдаются только
+    при общем кеше (CACHE_SHARED): туда их кладёт пересчёт в отдельном
+    процессе. Без него это один запрос, подписки отсеиваются в нём же.
+    """
+    if not user.is_authenticated:
+        return []
+    if settings.CACHE_SHARED:
+        rows = cache.get(key(user))
+        if rows is None:
+            rows = list(_stored(user)[:settings.POSTS_SUGGESTIONS])
+            cache.set(key(user), rows, settings.POSTS_SUGGESTIONS_TIMEOUT)
+        if rows and followed is None:
+            followed = follow_graph.following(user)
+    else:
+        suggested = _stored(user)
+        if followed is None:
+            suggested = suggested.exclude(
+                author__in=Follow.objects.filter(user=user).values('author')
+            )
+        rows = list(suggested[:settings.POSTS_SUGGESTIONS])
+    if not rows:
+        return []
+    return [
+        row for row in rows
+        if row['author_id'] not in (followed or ())
+        and row['author_id'] != exclude
+    ]
+
+
+def _rows(ids, field):
+    """Рёбра графа подписок (user_id, author_id), где field из ids."""
+    for part in chunks(sorted(ids), IN_CHUNK):
+        yield from Follow.objects.filter(
+            **{f'{field}__in': part}
+        ).values_list('user_id', 'author_id').iterator()
+
+
+def _adjacency(ids, field='user_id'):
+    """Разреженные строки матрицы смежности: id -> множество соседей.
+
+    field='user_id' — исходящие рёбра (на кого подписан),
+    field='author_id' — входящие (кто подписан).
+    """
+    rows = defaultdict(set)
+    for user_id, author_id in _rows(ids, field):
+        if field == 'user_id':
+            rows[user_id].add(author_id)
+        else:
+            rows[author_id].add(user_id)
+    return rows
+
+
+def _small_authors(author_ids):
+    """Авторы, чьих читателей не больше POSTS_SUGGESTION_FANOUT_LIMIT:
+    совпадение со слушателями популярных авторов ничего не говорит."""
+    small = set()
+    for part in chunks(sorted(author_ids), IN_CHUNK):
+        small.update(
+            Follow.objects.filter(author_id__in=part).values('author_id')
+            .annotate(readers=Count('id'))
+            .filter(readers__lte=settings.POSTS_SUGGESTION_FANOUT_LIMIT)
+            .values_list('author_id', flat=True)
+        )
+    return small
+
+
+def _popular(limit):
+    return list(
+        Follow.objects.values('author_id').annotate(readers=Count('id'))
+        .order_by('-readers', 'author_id')
+        .values_list('author_id', flat=True)[:limit]
+    )
+
+
+def compute(user_ids):
+    """Рекомендации для пользователей: {user_id: [(author_id, score,
+    mutual, co_follow), ...]}, лучшие первыми.
+
+    Для матрицы подписок A строка A·A даёт подписки подписок
+    (mutual), строка A·Aᵀ·A — авторов, которых читают люди с теми же
+    подписками (co_follow). Матрица читается только в окрестности
+    пересчитываемых пользователей, строки — множества, произведения —
+    Counter по ненулевым элементам.
+    """
+    following = _adjacency(user_ids)
+    authors = set().union(*following.values())
+    second = _adjacency(authors)
+    small = _small_authors(authors)
+    readers = _adjacency(small, field='author_id')
+    co_readers = _adjacency(set().union(*readers.values()))
+    popular = None
+    result = {}
+    for user_id in user_ids:
+        own = following.get(user_id, set())
+        mutual = Counter()
+        co_follow = Counter()
+        for author_id in own:
+            mutual.update(second.get(author_id, ()))
+            for reader_id in readers.get(author_id, ()):
+                if reader_id != user_id:
+                    co_follow.update(co_readers[reader_id])
+        candidates = (set(mutual) | set(co_follow)) - own - {user_id}
+        ranked = sorted(
+            (
+                (author_id,
+                 MUTUAL_WEIGHT * mutual[author_id] + co_follow[author_id],
+                 mutual[author_id], co_follow[author_id])
+                for author_id in candidates
+            ),
+            key=lambda row: (-row[1], row[0])
+        )[:settings.POSTS_SUGGESTIONS]
+        if not ranked:
+            if popular is None:
+                popular = _popular(settings.POSTS_SUGGESTIONS + 1)
+            ranked = [
+                (author_id, 0, 0, 0) for author_id in popular
+                if author_id != user_id
+            ][:settings.POSTS_SUGGESTIONS]
+        result[user_id] = ranked
+    return result
+
+
+def store(users, computed):
+    """Сохраняет рекомендации в таблицу и, при общем кеше, сразу
+    кладёт их в кеш."""
+    usernames = dict(User.objects.filter(pk__in={
+        row[0] for rows in computed.values() for row in rows
+    }).values_list('pk', 'username'))
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user__in=users).delete()
+        FollowSuggestion.objects.bulk_create(
+            FollowSuggestion(
+                user_id=user_id, author_id=author_id, score=score,
+                mutual=mutual, co_follow=co_follow
+            )
+            for user_id, rows in computed.items()
+            for author_id, score, mutual, co_follow in rows
+        )
+    if not settings.CACHE_SHARED:
+        return
+    cache.set_many({
+        key(user): [
+            {'author_id': author_id, 'username': usernames[author_id],
+             'mutual': mutual, 'co_follow': co_follow}
+            for author_id, _, mutual, co_follow in computed[user.pk]
+            if author_id in usernames
+        ]
+        for user in users
+    }, settings.POSTS_SUGGESTIONS_TIMEOUT)
+
+
+def mark_stale(user_id, author_id):
+    """Ставит в очередь тех, чьи рекомендации зависят от подписки
+    user_id -> author_id: его самого, его читателей (для них это
+    подписка подписки) и читателей автора (совпадение вкусов), если
+    автор не слишком популярен."""
+    limit = settings.POSTS_SUGGESTION_FANOUT_LIMIT
+    stale = {user_id}
+    stale.update(Follow.objects.filter(author_id=user_id).values_list(
+        'user_id', flat=True
+    )[:limit])
+    readers = list(Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )[:limit + 1])
+    if len(readers) <= limit:
+        stale.update(readers)
+    enqueue(stale)
+
+
+def enqueue(user_ids):
+    """Ставит в очередь существующих из user_ids пользователей."""
+    existing = User.objects.filter(pk__in=user_ids).values_list(
+        'pk', flat=True
+    )
+    SuggestionQueue.objects.bulk_create(
+        (SuggestionQueue(user_id=user_id) for user_id in existing),
+        ignore_conflicts=True
+    )
+
+
+def process(batch_size=200):
+    """Пересчитывает одну пачку очереди; возвращает её размер.
+
+    Пачка удаляется из очереди до пересчёта, так что подписки,
+    сделанные во время него, снова поставят пользователя в очередь.
+    """
+    user_ids = list(SuggestionQueue.objects.order_by('queued').values_list(
+        'user_id', flat=True
+    )[:batch_size])
+    if not user_ids:
+        return 0
+    SuggestionQueue.objects.filter(user_id__in=user_ids).delete()
+    users = list(User.objects.filter(pk__in=user_ids).only(
+        'pk', 'date_joined'
+    ))
+    store(users, compute([user.pk for user in users]))
+    return len(user_ids)
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import author_stats
+from ..models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class AuthorStatsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='stats-author')
+        cls.reader = User.objects.create_user(username='stats-reader')
+
+    def assertStats(self, user, **expected):
+        stats = AuthorStats.objects.get(author=user)
+        for field, value in expected.items():
+            self.assertEqual(getattr(stats, field), value, field)
+
+    def test_stats_follow_signals(self):
+        """Сводка сдвигается постами, комментариями и подписками"""
+        author_stats.get(self.author)
+        author_stats.get(self.reader)
+        first = Post.objects.create(author=self.author, text='Первый')
+        second = Post.objects.create(author=self.author, text='Второй')
+        Comment.objects.create(post=first, author=self.reader, text='Да')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(
+            self.author, posts_count=2, followers_count=1,
+            last_post_date=second.pub_date
+        )
+        self.assertStats(self.reader, following_count=1, comments_count=1)
+        second.delete()
+        follow.delete()
+        self.assertStats(
+            self.author, posts_count=1, followers_count=0,
+            last_post_date=first.pub_date
+        )
+        first.author = self.reader
+        first.save()
+        self.assertStats(self.author, posts_count=0, last_post_date=None)
+        self.assertStats(self.reader, posts_count=1, following_count=0)
+        self.assertEqual(author_stats.check(), [])
+
+    def test_stats_created_with_user(self):
+        """Сводка нового пользователя создаётся при регистрации"""
+        user = User.objects.create_user(username='stats-new')
+        with self.assertNumQueries(1):
+            self.assertEqual(author_stats.get(user).posts_count, 0)
+
+    def test_stats_read_with_one_query(self):
+        """Готовая сводка читается одним запросом"""
+        Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(author_stats.get(self.author).posts_count, 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(author_stats.get(self.author).posts_count, 1)
+
+    def test_rebuild_and_check_command(self):
+        """Команда пересчитывает сводки и находит расхождения"""
+        Post.objects.create(author=self.author, text='Пост')
+        out = StringIO()
+        call_command('author_stats', stdout=out)
+        self.assertStats(self.author, posts_count=1)
+        AuthorStats.objects.filter(author=self.author).update(posts_count=7)
+        with self.assertRaises(CommandError):
+            call_command('author_stats', check=True, stdout=out)
+        call_command('author_stats', check=True, fix=True, stdout=out)
+        self.assertStats(self.author, posts_count=1)
+        self.assertEqual(author_stats.check(), [])
@@ -0,0 +1,191 @@
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import author_stats, counters, search
+from ..management.commands import load_benchmark
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedBenchmarkTest(TestCase):
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент выполняются по индексам без сортировки"""
+        out = StringIO()
+        call_command(
+            'feed_benchmark', users=50, groups=5, posts=2000,
+            comments=2000, follows=5, stdout=out
+        )
+        self.assertNotIn('FAIL', out.getvalue())
+
+
+class ImportPostsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='archivist')
+        cls.group = Group.objects.create(title='Архив', slug='archive')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = Path(self.directory.name) / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def test_import_jsonl(self):
+        """JSONL загружается пачками с датами из архива и обновляет
+        производные данные"""
+        rows = [
+            {'text': f'Архивный пост {i}', 'author': 'archivist',
+             'group': 'archive', 'pub_date': f'2020-01-0{i + 1}T10:00:00'}
+            for i in range(5)
+        ]
+        rows.append({'text': 'Новый автор', 'author': 'newcomer'})
+        rows.append({'text': 'Без группы', 'author': 'archivist',
+                     'group': 'missing'})
+        path = self.write('posts.jsonl', '\n'.join(map(json.dumps, rows)))
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, batch_size=2, create_authors=True,
+            stdout=out, stderr=err
+        )
+        self.assertIn('Загружено постов: 6, пропущено: 1', out.getvalue())
+        self.assertIn('missing', err.getvalue())
+        self.assertEqual(Post.objects.filter(author=self.user).count(), 5)
+        self.assertEqual(
+            Post.objects.filter(author=self.user).first().pub_date.day, 5
+        )
+        self.assertEqual(author_stats.get(self.user).posts_count, 5)
+        self.assertEqual(counters.posts_count(group=self.group), 5)
+        self.assertEqual(author_stats.check(), [])
+        self.assertEqual(
+            search.filter_queryset(Post.objects.all(), 'архивный').count(), 5
+        )
+        self.assertFalse(User.objects.get(username='newcomer')
+                         .has_usable_password())
+
+    def test_import_csv(self):
+        """CSV читается по заголовку"""
+        path = self.write(
+            'posts.csv', 'text,author,group\nИз таблицы,archivist,archive\n'
+        )
+        call_command('import_posts', path, stdout=StringIO())
+        post = Post.objects.get(text='Из таблицы')
+        self.assertEqual(post.group, self.group)
+
+
+class ExportYatubeTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='exporter')
+        cls.reader = User.objects.create_user(username='export-reader')
+        cls.post = Post.objects.create(author=cls.user, text='Выгрузка')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.output = Path(self.directory.name)
+
+    def read(self, name):
+        with gzip.open(self.output / name, 'rt', encoding='utf-8') as dump:
+            return [json.loads(line) for line in dump]
+
+    def test_incremental_export(self):
+        """Повторная выгрузка с файлом состояния отдаёт только новые строки"""
+        state = self.output / 'state.json'
+        call_command(
+            'export_yatube', str(self.output), state=state, stdout=StringIO()
+        )
+        posts = self.read('post.jsonl.gz')
+        self.assertEqual([row['text'] for row in posts], ['Выгрузка'])
+        self.assertEqual(len(self.read('comment.jsonl.gz')), 1)
+        self.assertEqual(len(self.read('follow.jsonl.gz')), 1)
+        Post.objects.create(author=self.user, text='Новый')
+        call_command(
+            'export_yatube', str(self.output), state=state, stdout=StringIO()
+        )
+        self.assertEqual(
+            [row['text'] for row in self.read('post.jsonl.gz')], ['Новый']
+        )
+        self.assertEqual(self.read('comment.jsonl.gz'), [])
+        self.assertEqual(self.read('follow.jsonl.gz'), [])
+
+    def test_csv_export(self):
+        """CSV выгружается с заголовком"""
+        call_command(
+            'export_yatube', str(self.output), format='csv',
+            models=['post'], stdout=StringIO()
+        )
+        with gzip.open(self.output / 'post.csv.gz', 'rt') as dump:
+            lines = dump.read().splitlines()
+        self.assertEqual(lines[0], 'id,author_id,group_id,text,pub_date,image')
+        self.assertEqual(len(lines), 2)
+
+
+class LoadBenchmarkTest(TestCase):
+
+    def test_every_route_measured(self):
+        """Прогон обходит все маршруты и удаляет свои данные"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'bench.json'
+            call_command(
+                'load_benchmark', users=3, groups=1, posts=5, comments=5,
+                follows=1, requests=1, concurrency=1, json=path,
+                stdout=StringIO(), stderr=StringIO()
+            )
+            report = json.loads(path.read_text())
+        self.assertEqual(
+            set(report['routes']), load_benchmark.url_names()
+        )
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(report['total']['requests'], len(report['routes']))
+        self.assertFalse(
+            User.objects.filter(username__startswith='load-').exists()
+        )
+
+    def test_refuses_database_with_prefixed_accounts(self):
+        """Прогон не идёт по БД, где уже есть аккаунты с префиксом,
+        и не трогает их"""
+        User.objects.create_user(username='load-real')
+        with self.assertRaises(CommandError):
+            call_command(
+                'load_benchmark', users=3, groups=1, posts=5, comments=5,
+                follows=1, requests=1, concurrency=1, stdout=StringIO()
+            )
+        self.assertTrue(User.objects.filter(username='load-real').exists())
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_cleanup_deletes_only_created_rows(self):
+        """Уборка удаляет пользователей и группы, созданные прогоном,
+        но не чужие с тем же префиксом"""
+        command = load_benchmark.Command()
+        command.signup_names = ['load-signup-0']
+        command.users = [User.objects.create_user(username='load-0')]
+        command.groups = [Group.objects.create(title='Сид', slug='load-0')]
+        User.objects.create_user(username='load-signup-0')
+        User.objects.create_user(username='load-real')
+        Group.objects.create(title='Настоящая', slug='load-real')
+        command.cleanup()
+        self.assertEqual(
+            list(User.objects.values_list('username', flat=True)),
+            ['load-real']
+        )
+        self.assertEqual(
+            list(Group.objects.values_list('slug', flat=True)), ['load-real']
+        )
@@ -0,0 +1,72 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import counters
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedCounterTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter-author')
+        cls.group = Group.objects.create(title='Счётчики', slug='counters')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def test_counters_follow_post_signals(self):
+        """Счётчики сдвигаются при создании, переносе и удалении поста"""
+        self.assertEqual(counters.posts_count(group=self.group), 0)
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тест'
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.posts_count(group=self.group), 1)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(counters.posts_count(group=self.group), 0)
+        self.assertEqual(counters.posts_count(group=self.other_group), 1)
+        post.delete()
+        self.assertEqual(counters.posts_count(group=self.other_group), 0)
+
+    def test_lazy_counter_created_from_count(self):
+        """Ленивый счётчик создаётся одним INSERT ... SELECT COUNT(*)"""
+        Post.objects.bulk_create([
+            Post(author=self.user, group=self.group, text=f'Тест {i}')
+            for i in range(3)
+        ])
+        with self.assertNumQueries(3):
+            self.assertEqual(counters.posts_count(group=self.group), 3)
+        self.assertEqual(counters.posts_count(), 3)
+        self.assertEqual(counters.check(), [])
+
+    def test_check_finds_and_fixes_drift(self):
+        """feed_counters --check находит расхождения, --fix их чинит"""
+        Post.objects.create(author=self.user, group=self.group, text='Тест')
+        counters.posts_count(group=self.group)
+        key = counters.group_key(self.group.pk)
+        counters.bump(key, 5)
+        with self.assertRaises(CommandError):
+            call_command('feed_counters', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('feed_counters', '--check', '--fix', stdout=out)
+        self.assertIn(f'{key}: сохранено 6, на самом деле 1', out.getvalue())
+        self.assertEqual(counters.check(), [])
+        self.assertEqual(counters.posts_count(group=self.group), 1)
+
+    def test_rebuild_counts_every_feed(self):
+        """feed_counters без --check пересоздаёт все счётчики"""
+        Post.objects.bulk_create([
+            Post(author=self.user, group=self.group, text='Тест'),
+            Post(author=self.user, group=self.other_group, text='Тест'),
+            Post(author=self.user, text='Тест'),
+        ])
+        call_command('feed_counters', stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.posts_count(), 3)
+        self.assertEqual(counters.posts_count(group=self.other_group), 1)
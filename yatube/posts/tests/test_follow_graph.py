@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .. import follow_graph
+from ..models import Follow
+
+User = get_user_model()
+
+
+@override_settings(CACHE_SHARED=True)
+class FollowGraphTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='writer')
+
+    def test_follow_checks_use_cache(self):
+        """Проверка подписки не ходит в БД, пока множество в кеше"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(follow_graph.follows(self.user, self.author.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.follows(self.user, self.author.pk))
+            self.assertFalse(follow_graph.follows(self.user, self.user.pk))
+
+    def test_follow_changes_update_cache(self):
+        """Подписка и отписка меняют уже собранное множество"""
+        self.assertEqual(follow_graph.following(self.user), frozenset())
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follow_graph.following(self.user), {self.author.pk}
+            )
+        Follow.objects.filter(user=self.user).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following(self.user), frozenset())
+
+    def test_rolled_back_follow_keeps_cache(self):
+        """Откатившаяся подписка не попадает в множество"""
+        follow_graph.following(self.user)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.user, author=self.author)
+                Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(follow_graph.following(self.user), frozenset())
+
+    @override_settings(CACHE_SHARED=False)
+    def test_unfollow_skips_user_lookup_without_shared_cache(self):
+        """Без общего кеша отписка не читает пользователя"""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            follow.delete()
+        self.assertFalse(
+            [query for query in queries
+             if '"auth_user"."id" = ' in query['sql']]
+        )
+
+    def test_reused_id_gets_own_set(self):
+        """Новый пользователь с тем же id не видит чужих подписок"""
+        Follow.objects.create(user=self.user, author=self.author)
+        follow_graph.following(self.user)
+        self.user.date_joined += timedelta(seconds=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follow_graph.following(self.user), {self.author.pk}
+            )
+
+    @override_settings(CACHE_SHARED=False)
+    def test_follow_checks_read_db_without_shared_cache(self):
+        """Без общего кеша подписки читаются из БД: в другом воркере
+        сигнал их бы не обновил"""
+        follow_graph.following(self.user)
+        Follow.objects.bulk_create(
+            [Follow(user=self.user, author=self.author)]
+        )
+        self.assertTrue(follow_graph.follows(self.user, self.author.pk))
+        self.assertEqual(
+            follow_graph.following(self.user), {self.author.pk}
+        )
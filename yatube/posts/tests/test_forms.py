@@ -1,6 +1,7 @@
 import shutil
 import tempfile
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
@@ -8,13 +9,20 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 
 from http import HTTPStatus
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
 from ..models import Post, Group
+from ..views import prepare_cards
+from ..thumbnails import (
+    THUMBNAIL_SIZES, PrecomputedThumbnailBackend, attach_thumbnails
+)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
 class PostFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -116,6 +124,58 @@ class PostFormTest(TestCase):
         self.assertTrue(post.image)
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
+    def test_post_create_pregenerates_thumbnails(self):
+        """Миниатюры готовятся при сохранении, а не при показе"""
+        cache.clear()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': self.uploaded_image},
+            follow=True
+        )
+        post = Post.objects.get(text='С картинкой')
+        backend = PrecomputedThumbnailBackend()
+        for geometry_string, options in THUMBNAIL_SIZES:
+            thumbnail = backend.thumbnail_file(
+                ImageFile(post.image), geometry_string, dict(options)
+            )
+            self.assertIsNotNone(default.kvstore.get(thumbnail))
+            self.assertContains(response, thumbnail.url)
+
+    def test_thumbnails_resolved_in_one_query(self):
+        """Миниатюры страницы находятся одним запросом к хранилищу"""
+        for text in ('Первая', 'Вторая'):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': text, 'image': SimpleUploadedFile(
+                    name=f'{text}.gif', content=self.small_gif,
+                    content_type='image/gif'
+                )}
+            )
+        posts = list(Post.objects.filter(text__in=('Первая', 'Вторая')))
+        cache.clear()
+        with self.assertNumQueries(1):
+            attach_thumbnails(posts)
+        for post in posts:
+            self.assertIsNotNone(post.thumbnail)
+        with self.assertNumQueries(0):
+            attach_thumbnails(posts)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_card_without_thumbnail_not_cached(self):
+        """Карточка с картинкой без готовой миниатюры не кешируется"""
+        post = Post.objects.create(
+            author=self.author, text='Без миниатюры',
+            image=SimpleUploadedFile(
+                name='pending.gif', content=self.small_gif,
+                content_type='image/gif'
+            )
+        )
+        cache.clear()
+        prepare_cards([post])
+        [card] = prepare_cards([post])
+        self.assertIsNone(card.thumbnail)
+        self.assertIsNone(card.card_version)
+
 
 class CommentFormTest(TestCase):
     @classmethod
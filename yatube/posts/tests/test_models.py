@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -34,3 +35,14 @@ class PostModelTest(TestCase):
         group = self.group
         expected_name = group.title
         self.assertEqual(expected_name, str(group))
+
+
+class FollowModelTest(TestCase):
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена"""
+        user = User.objects.create_user(username='follower')
+        author = User.objects.create_user(username='followed')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
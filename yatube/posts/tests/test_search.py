@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+class SearchIndexTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='search-author')
+
+    def check_index(self):
+        post = Post.objects.create(author=self.user, text='Зелёная Ёлка')
+        other = Post.objects.create(author=self.user, text='Синее море')
+        posts = Post.objects.all()
+        self.assertEqual(
+            list(search.filter_queryset(posts, 'зеленая ёлка')), [post]
+        )
+        post.text = 'Красная рыба'
+        post.save()
+        self.assertFalse(search.filter_queryset(posts, 'ёлка').exists())
+        self.assertEqual(list(search.filter_queryset(posts, 'рыба')), [post])
+        post.delete()
+        self.assertFalse(search.filter_queryset(posts, 'рыба').exists())
+        self.assertEqual(search.rebuild(), 1)
+        self.assertEqual(list(search.filter_queryset(posts, 'море')), [other])
+
+    def test_fts5_index_follows_posts(self):
+        """Индекс FTS5 следует за созданием, правкой и удалением постов"""
+        if not search.fts5_available():
+            self.skipTest('SQLite собран без FTS5')
+        with override_settings(POSTS_SEARCH_BACKEND='fts5'):
+            self.check_index()
+
+    @override_settings(POSTS_SEARCH_BACKEND='python')
+    def test_python_index_follows_posts(self):
+        """Резервный индекс ведёт себя так же, как FTS5"""
+        self.check_index()
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import follow_graph, suggestions
+from ..models import Follow, FollowSuggestion, SuggestionQueue
+
+User = get_user_model()
+
+
+class FollowSuggestionsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('me', 'a', 'b', 'c', 'd', 'e', 'reader')
+        }
+        for user, author in (
+            ('me', 'a'), ('me', 'b'), ('a', 'c'), ('b', 'c'), ('b', 'd'),
+            ('reader', 'a'), ('reader', 'e'),
+        ):
+            Follow.objects.create(
+                user=self.users[user], author=self.users[author]
+            )
+
+    def names(self, rows):
+        by_id = {user.pk: name for name, user in self.users.items()}
+        return [by_id[row[0]] for row in rows]
+
+    def test_friends_of_friends_and_co_follow(self):
+        """Подписки подписок весят больше совпадений с другим читателем"""
+        me = self.users['me']
+        ranked = suggestions.compute([me.pk])[me.pk]
+        self.assertEqual(self.names(ranked), ['c', 'd', 'e'])
+        self.assertEqual(ranked[0][1:], (4, 2, 0))
+        self.assertEqual(ranked[2][1:], (1, 0, 1))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_processed_queue_served_from_cache(self):
+        """Пересчёт очереди сохраняет рекомендации и кладёт их в кеш"""
+        me = self.users['me']
+        suggestions.enqueue([me.pk])
+        self.assertEqual(suggestions.process(), 1)
+        self.assertFalse(SuggestionQueue.objects.exists())
+        self.assertEqual(me.follow_suggestions.count(), 3)
+        follow_graph.following(me)
+        with self.assertNumQueries(0):
+            rows = suggestions.for_user(me, exclude=self.users['d'].pk)
+        self.assertEqual([row['username'] for row in rows], ['c', 'e'])
+        self.client.force_login(me)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'На кого подписаться')
+
+    def test_suggestions_read_from_db_without_shared_cache(self):
+        """Без общего кеша рекомендации читаются из таблицы: пересчёт
+        в другом процессе не виден кешу воркера"""
+        me = self.users['me']
+        with self.assertNumQueries(1):
+            self.assertEqual(suggestions.for_user(me), [])
+        FollowSuggestion.objects.create(
+            user=me, author=self.users['c'], score=1
+        )
+        FollowSuggestion.objects.create(
+            user=me, author=self.users['a'], score=2
+        )
+        with self.assertNumQueries(1):
+            rows = suggestions.for_user(me)
+        self.assertEqual([row['username'] for row in rows], ['c'])
+        followed = follow_graph.following(me)
+        with self.assertNumQueries(1):
+            rows = suggestions.for_user(me, followed=followed)
+        self.assertEqual([row['username'] for row in rows], ['c'])
+
+    def test_follow_marks_neighbours_stale(self):
+        """Новая подписка ставит в очередь её автора и читателей"""
+        suggestions.mark_stale(self.users['me'].pk, self.users['d'].pk)
+        self.assertEqual(
+            set(SuggestionQueue.objects.values_list('user_id', flat=True)),
+            {self.users['me'].pk, self.users['b'].pk}
+        )
+
+    def test_newcomer_gets_popular_authors(self):
+        """Без подписок рекомендуются самые читаемые авторы"""
+        newcomer = User.objects.create_user(username='newcomer')
+        ranked = suggestions.compute([newcomer.pk])[newcomer.pk]
+        self.assertEqual(self.names(ranked)[:2], ['a', 'c'])
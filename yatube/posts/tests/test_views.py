@@ -1,10 +1,18 @@
+import base64
+import json
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
 
+from .. import author_stats, counters, fragments, timelines
+from ..views import AMOUNT_COMMENTS, prepare_cards
 from ..models import Post, Group, Follow, Comment
 
 POST_ON_PAGE = 0
@@ -188,6 +196,8 @@ class PaginatorViewsTest(TestCase):
             group=cls.group)
             for i in range(13)]
         Post.objects.bulk_create(fixtures)
+        # bulk_create не вызывает сигналы, сводку автора пересчитываем
+        author_stats.refresh([cls.user.pk])
 
     def setUp(self):
         self.authorized_client = Client()
@@ -212,6 +222,59 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), 3)
 
 
+@override_settings(POSTS_KEYSET_PAGINATION=True)
+class KeysetPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-keyset')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(13)
+        )
+        cls.url_profile = reverse(
+            'posts:profile', kwargs={'username': cls.user.username}
+        )
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ведут на следующую и предыдущую страницы без пропусков"""
+        first = self.client.get(self.url_profile).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            self.url_profile, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-pk')
+                 .values_list('pk', flat=True))
+        )
+        back = self.client.get(
+            self.url_profile, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу"""
+        cursors = ['broken'] + [
+            base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+            for raw in (['next', 'garbage', 1], ['next', None, 1],
+                        ['next', '2022-01-01T00:00:00', None])
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.url_profile, {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+
+@override_settings(CACHE_SHARED=True)
 class IndexCacheTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -230,15 +293,59 @@ class IndexCacheTests(TestCase):
 
     def test_cache_index_page(self):
         """Проверяем кеш главной страницы"""
+        cache.clear()
+        first_step = self.authorized_client.get(self.url_index)
+        Post.objects.filter(id=self.test_post.id).update(
+            text='Изменённый текст поста'
+        )
+        with self.assertNumQueries(2):
+            second_step = self.authorized_client.get(self.url_index)
+        self.assertEqual(first_step.content, second_step.content)
+        cache.clear()
+        third_step = self.authorized_client.get(self.url_index)
+        self.assertNotEqual(first_step.content, third_step.content)
+
+    def test_index_cache_reset_by_post_save(self):
+        """Сохранение поста сразу сбрасывает кеш главной страницы"""
+        cache.clear()
         first_step = self.authorized_client.get(self.url_index)
         post = Post.objects.get(id=self.test_post.id)
         post.text = 'Изменённый текст поста'
         post.save()
         second_step = self.authorized_client.get(self.url_index)
-        self.assertEqual(first_step.content, second_step.content)
+        self.assertNotEqual(first_step.content, second_step.content)
+        self.assertContains(second_step, 'Изменённый текст поста')
+
+    def test_index_cache_reset_by_group_and_author_rename(self):
+        """Главная не ссылается на старый slug группы и старое имя"""
+        group = Group.objects.create(title='Группа', slug='old-slug')
+        Post.objects.filter(pk=self.test_post.pk).update(group=group)
         cache.clear()
-        third_step = self.authorized_client.get(self.url_index)
-        self.assertNotEqual(first_step.content, third_step.content)
+        self.assertContains(
+            self.guest_client.get(self.url_index), '/group/old-slug/'
+        )
+        group.slug = 'new-slug'
+        group.save()
+        response = self.guest_client.get(self.url_index)
+        self.assertContains(response, '/group/new-slug/')
+        self.assertNotContains(response, '/group/old-slug/')
+        self.test_user.first_name = 'Переименованный'
+        self.test_user.save()
+        self.assertContains(
+            self.guest_client.get(self.url_index), 'Переименованный'
+        )
+
+    @override_settings(CACHE_SHARED=False)
+    def test_index_not_cached_without_shared_cache(self):
+        """Без общего кеша страницы лент читаются из БД"""
+        cache.clear()
+        self.guest_client.get(self.url_index)
+        Post.objects.bulk_create([
+            Post(author=self.test_user, text='Пост без сигналов')
+        ])
+        self.assertContains(
+            self.guest_client.get(self.url_index), 'Пост без сигналов'
+        )
 
 
 class FollowTests(TestCase):
@@ -294,3 +401,298 @@ class FollowTests(TestCase):
         self.assertContains(response, self.post.text, status_code=200)
         response = self.guest_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, self.post.text, status_code=200)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_follow_feed_reads_cached_authors(self):
+        """Лента подписок берёт авторов из кеша, без JOIN подписок."""
+        self.authorized_client.get(reverse('posts:profile_follow', kwargs={
+            'username': self.author_user.username}))
+        self.authorized_client.get(reverse('posts:follow_index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+        self.assertContains(response, self.post.text)
+        self.assertFalse(
+            [query for query in queries if 'posts_follow' in query['sql']]
+        )
+
+
+@override_settings(POSTS_TIMELINES=True, CACHE_SHARED=True)
+class TimelineFollowTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.client.force_login(self.user)
+        self.author = User.objects.create_user(username='writer')
+        self.url_follow_index = reverse('posts:follow_index')
+
+    def feed_texts(self):
+        response = self.client.get(self.url_follow_index)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_push_backfill_and_prune(self):
+        """Лента подписок пополняется при публикации и чистится отпиской"""
+        Post.objects.create(author=self.author, text='Старый пост')
+        self.assertEqual(self.feed_texts(), [])
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'writer'}
+        ))
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.feed_texts(), ['Новый пост', 'Старый пост'])
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'writer'}
+        ))
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_request(self):
+        """Посты популярного автора подмешиваются при чтении ленты"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.feed_texts(), [])
+        Post.objects.create(author=self.author, text='Пост звезды')
+        self.assertEqual(self.feed_texts(), ['Пост звезды'])
+
+    @override_settings(CACHE_SHARED=False)
+    def test_timelines_need_shared_cache(self):
+        """Без общего кеша лента подписок читается из БД"""
+        self.assertFalse(timelines.enabled())
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.feed_texts(), ['Пост'])
+        self.assertIsNone(cache.get(timelines.timeline_key(self.user.pk)))
+
+
+@override_settings(CACHE_SHARED=True)
+class PostCardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='card-author')
+        self.post = Post.objects.create(author=self.author, text='Первый')
+        self.url_profile = reverse(
+            'posts:profile', kwargs={'username': self.author.username}
+        )
+
+    def test_card_is_reused_until_post_saved(self):
+        """Карточка берётся из кеша, пока пост не сохранён заново"""
+        self.client.get(self.url_profile)
+        self.client.get(self.url_profile)
+        Post.objects.filter(pk=self.post.pk).update(text='Второй')
+        response = self.client.get(self.url_profile)
+        self.assertContains(response, 'Первый')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        response = self.client.get(self.url_profile)
+        self.assertContains(response, 'Второй')
+        self.assertNotContains(response, 'Первый')
+
+    def test_card_read_before_change_not_cached(self):
+        """Карточка строки, прочитанной до сохранения поста, не кешируется"""
+        prepare_cards([self.post])
+        since = fragments.stamp()
+        stale = Post.objects.get(pk=self.post.pk)
+        self.post.text = 'Второй'
+        self.post.save()
+        [card] = prepare_cards([stale], since=since)
+        self.assertIsNone(card.card_version)
+        [card] = prepare_cards([Post.objects.get(pk=self.post.pk)])
+        self.assertIsNotNone(card.card_version)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_cards_need_shared_cache(self):
+        """Без общего кеша карточки не кешируются и кеш не опрашивается"""
+        prepare_cards([self.post])
+        [card] = prepare_cards([self.post])
+        self.assertIsNone(card.card_version)
+        self.assertFalse(cache.get_many([f'card:post:{self.post.pk}']))
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True)
+class FeedQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='budget-reader')
+        cls.group = Group.objects.create(title='Бюджет', slug='budget')
+        for i in range(AMOUNT_POST):
+            author = User.objects.create_user(
+                username=f'budget-{i}', first_name=f'Имя {i}'
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {i}'
+            )
+        counters.posts_count()
+        counters.posts_count(group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_feeds_fit_query_budget(self):
+        """Ленты с уже созданными счётчиками укладываются в бюджет
+        запросов независимо от числа авторов на странице"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'budget-0'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class CommentPaginationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.author, text='Обсуждение')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Коммент {i}')
+            for i in range(AMOUNT_COMMENTS + 5)
+        )
+
+    def test_post_detail_shows_first_comment_page(self):
+        """На странице поста только первая страница комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), AMOUNT_COMMENTS)
+        self.assertEqual(comments[0].text, 'Коммент 0')
+        self.assertTrue(comments.has_next())
+
+    def test_comment_list_returns_next_page(self):
+        """Фрагмент по курсору продолжает список без повторов
+        и выбирает авторов тем же запросом"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        cursor = response.context['comments'].next_cursor
+        url = reverse('posts:comment_list', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Коммент {i}'
+             for i in range(AMOUNT_COMMENTS, AMOUNT_COMMENTS + 5)]
+        )
+        self.assertFalse(comments.has_next())
+
+
+@override_settings(POSTS_STREAMING=True, POSTS_STREAM_CHUNK_SIZE=3)
+class StreamingResponseTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='streamer')
+        cls.group = Group.objects.create(title='Поток', slug='stream')
+        for i in range(AMOUNT_POST):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Поток {i}'
+            )
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Реплика {i}')
+            for i in range(AMOUNT_COMMENTS + 1)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_content(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_feeds_stream_page_with_paginator(self):
+        """Ленты отдаются потоком: карточки страницы и паджинатор"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'streamer'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.get_content(url)
+                self.assertEqual(content.count('<article>'), 10)
+                self.assertEqual(content.count('<hr>'), 9)
+                self.assertIn(f'Поток {AMOUNT_POST - 1}', content)
+                self.assertIn('?page=2', content)
+                self.assertTrue(content.rstrip().endswith('</html>'))
+
+    @override_settings(POSTS_KEYSET_PAGINATION=True)
+    def test_keyset_stream_knows_next_cursor(self):
+        """Курсор следующей страницы известен после потока карточек"""
+        content = self.get_content(reverse('posts:index'))
+        self.assertEqual(content.count('<article>'), 10)
+        self.assertIn('?cursor=', content)
+
+    def test_post_detail_streams_comments(self):
+        """Комментарии поста отдаются потоком и подгружаются дальше"""
+        content = self.get_content(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertIn('Реплика 0', content)
+        self.assertEqual(content.count('media-body'), AMOUNT_COMMENTS)
+        self.assertIn('js-more-comments', content)
+
+
+class SearchViewTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+        cls.url = reverse('posts:search')
+
+    def setUp(self):
+        cache.clear()
+
+    def check_search(self):
+        Post.objects.create(author=self.author, text='кот и собака')
+        best = Post.objects.create(
+            author=self.author, text='кот кот кот и ещё раз кот'
+        )
+        for i in range(AMOUNT_POST):
+            Post.objects.create(author=self.author, text=f'Про кота {i}')
+        response = self.client.get(self.url, {'q': 'Кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertEqual(page_obj[0], best)
+        self.assertEqual(
+            self.client.get(self.url, {'q': 'кота'})
+            .context['page_obj'].paginator.count,
+            AMOUNT_POST
+        )
+        response = self.client.get(self.url, {'q': 'кота', 'page': 2})
+        self.assertEqual(
+            len(response.context['page_obj']), AMOUNT_POST - 10
+        )
+        self.assertContains(response, '?page=1&amp;q=%D0%BA%D0%BE%D1%82%D0%B0')
+
+    def test_search_ranks_and_paginates(self):
+        """Поиск ранжирует посты и сохраняет запрос в паджинаторе"""
+        self.check_search()
+
+    @override_settings(POSTS_SEARCH_BACKEND='python')
+    def test_python_backend_search(self):
+        """Резервный индекс ранжирует так же"""
+        self.check_search()
+
+    def test_empty_query(self):
+        """Без запроса показывается только форма"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIsNone(response.context['page_obj'])
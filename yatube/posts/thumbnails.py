@@ -0,0 +1,173 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+# Все размеры миниатюр, которые используют шаблоны
+THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def _generate(task, name, geometry_string, options, close_connection):
+    try:
+        ThumbnailBackend().get_thumbnail(name, geometry_string, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    finally:
+        with _lock:
+            _pending.discard(task)
+        if close_connection:
+            connection.close()
+
+
+def _submit(task, name, geometry_string, options):
+    with _lock:
+        if task in _pending:
+            return
+        _pending.add(task)
+    _pool().submit(_generate, task, name, geometry_string, options, True)
+
+
+def schedule(name, geometry_string, options):
+    """Ставит создание миниатюры в очередь фоновых потоков.
+
+    Задача уходит в пул после фиксации транзакции, чтобы поток не
+    читал незафиксированные данные. При POSTS_THUMBNAIL_WORKERS = 0
+    миниатюра создаётся сразу.
+    """
+    task = (name, geometry_string, tuple(sorted(options.items())))
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        _generate(task, name, geometry_string, options, False)
+        return
+    transaction.on_commit(
+        partial(_submit, task, name, geometry_string, options)
+    )
+
+
+def pregenerate(post):
+    """Готовит все миниатюры картинки поста после сохранения."""
+    if not post.image:
+        return
+    for geometry_string, options in THUMBNAIL_SIZES:
+        schedule(post.image.name, geometry_string, dict(options))
+
+
+class PrecomputedThumbnailBackend(ThumbnailBackend):
+    """Отдаёт только готовые миниатюры, не создавая их в запросе.
+
+    Если записи о миниатюре ещё нет, создание ставится в очередь,
+    а шаблон получает исходную картинку; без пула миниатюра
+    создаётся сразу, как в обычном бэкенде sorl.
+    """
+
+    def thumbnail_file(self, source, geometry_string, options):
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = self.thumbnail_file(
+            source, geometry_string, dict(options)
+        )
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        if not settings.POSTS_THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        schedule(source.name, geometry_string, options)
+        return source
+
+
+class BatchKVStore(CachedDBKVStore):
+    """Хранилище sorl с выборкой многих записей за один заход."""
+
+    def get_many(self, image_files):
+        """Словарь key -> ImageFile для найденных записей.
+
+        Сначала один get_many к кешу, затем один запрос к БД
+        для промахов кеша.
+        """
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(fetched)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in values.items()
+            if value != EMPTY_VALUE
+        }
+
+
+def attach_thumbnails(posts):
+    """Проставляет постам готовые миниатюры одним обращением к хранилищу.
+
+    post.thumbnail — ImageFile или None; для None шаблон откатывается
+    к тегу {% thumbnail %}.
+    """
+    posts = list(posts)
+    geometry_string, options = THUMBNAIL_SIZES[0]
+    backend = PrecomputedThumbnailBackend()
+    files = {
+        post.pk: backend.thumbnail_file(
+            ImageFile(post.image), geometry_string, dict(options)
+        )
+        for post in posts if post.image
+    }
+    found = {}
+    if files and hasattr(default.kvstore, 'get_many'):
+        found = default.kvstore.get_many(files.values())
+    for post in posts:
+        thumbnail = files.get(post.pk)
+        post.thumbnail = found.get(thumbnail.key) if thumbnail else None
+    return posts
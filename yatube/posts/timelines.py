@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from core.cache import locked
+
+from .models import Follow, Post
+
+LOCK = 'timelines'
+CELEBRITIES_KEY = 'timeline:celebrities'
+CELEBRITIES_TIMEOUT = 60 * 5
+
+
+def enabled():
+    """Ленты собираются, только если кеш общий для воркеров: иначе
+    сигнал дополнил бы ленту лишь в кеше процесса, принявшего пост."""
+    return settings.POSTS_TIMELINES and settings.CACHE_SHARED
+
+
+def timeline_key(user_id):
+    return f'timeline:{user_id}'
+
+
+def _entry(pub_date, post_id, author_id):
+    return [pub_date.timestamp(), post_id, author_id]
+
+
+def _merge(entries, extra):
+    """Объединяет записи без дублей, сортирует и обрезает ленту."""
+    seen = {}
+    for entry in list(entries) + list(extra):
+        seen[entry[1]] = entry
+    merged = sorted(seen.values(), key=lambda e: (e[0], e[1]), reverse=True)
+    return merged[:settings.POSTS_TIMELINE_LENGTH]
+
+
+def _author_entries(author_ids):
+    posts = Post.objects.filter(author_id__in=author_ids).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pub_date', 'pk', 'author_id')
+    return [
+        _entry(*row) for row in posts[:settings.POSTS_TIMELINE_LENGTH]
+    ]
+
+
+def celebrities():
+    """Авторы, чьи посты читаются при запросе, а не раскладываются."""
+    authors = cache.get(CELEBRITIES_KEY)
+    if authors is None:
+        authors = set(
+            Follow.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gte=settings.POSTS_TIMELINE_FANOUT_LIMIT
+            ).values_list('author', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, authors, CELEBRITIES_TIMEOUT)
+    return authors
+
+
+def _save(timelines):
+    cache.set_many(timelines, settings.POSTS_TIMELINE_TIMEOUT)
+
+
+def _follower_keys(author_id):
+    return [
+        timeline_key(user_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ]
+
+
+def _update(keys, change):
+    """Меняет уже собранные ленты под замком LOCK.
+
+    Чтение и запись ленты — get и set: без замка два поста,
+    опубликованные одновременно, затёрли бы друг друга.
+    """
+    with locked(LOCK) as source:
+        _save({
+            key: change(entries)
+            for key, entries in source.get_many(keys).items()
+        })
+
+
+def build(user_id):
+    """Собирает ленту с нуля по подпискам пользователя."""
+    with locked(LOCK):
+        author_ids = set(
+            Follow.objects.filter(user_id=user_id).values_list(
+                'author_id', flat=True
+            )
+        ) - celebrities()
+        entries = _author_entries(author_ids) if author_ids else []
+        _save({timeline_key(user_id): entries})
+    return entries
+
+
+def push(post):
+    """Кладёт новый пост в уже собранные ленты подписчиков автора."""
+    if post.author_id in celebrities():
+        return
+    entry = _entry(post.pub_date, post.pk, post.author_id)
+    _update(
+        _follower_keys(post.author_id),
+        lambda entries: _merge(entries, [entry])
+    )
+
+
+def remove(author_id, post_id):
+    """Убирает удалённый пост из лент подписчиков."""
+    _update(
+        _follower_keys(author_id),
+        lambda entries: [entry for entry in entries if entry[1] != post_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Дополняет ленту постами нового автора после подписки."""
+    if author_id in celebrities():
+        return
+    _update(
+        [timeline_key(user_id)],
+        lambda entries: _merge(entries, _author_entries([author_id]))
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    _update(
+        [timeline_key(user_id)],
+        lambda entries: [
+            entry for entry in entries if entry[2] != author_id
+        ]
+    )
+
+
+def invalidate(author_ids):
+    """Сбрасывает ленты подписчиков авторов; они соберутся заново.
+
+    Нужен после загрузки постов мимо сигналов (import_posts).
+    """
+    cache.delete_many([
+        timeline_key(user_id)
+        for user_id in Follow.objects.filter(
+            author_id__in=author_ids
+        ).values_list('user_id', flat=True).distinct()
+    ])
+
+
+def feed(user_id):
+    """Список id постов ленты подписок, новые сверху.
+
+    Лента хранится в кеше как ограниченный список
+    [timestamp, post_id, author_id]; посты авторов с большим числом
+    подписчиков подмешиваются при чтении (fan-out-on-read).
+    """
+    entries = cache.get(timeline_key(user_id))
+    if entries is None:
+        entries = build(user_id)
+    famous = celebrities()
+    if famous:
+        followed = Follow.objects.filter(
+            user_id=user_id, author_id__in=famous
+        ).values_list('author_id', flat=True)
+        famous_ids = list(followed)
+        if famous_ids:
+            entries = _merge(entries, _author_entries(famous_ids))
+    return [entry[1] for entry in entries]
@@ -20,6 +20,11 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    # Подгрузка следующих страниц комментариев
+    path('posts/<int:post_id>/comments/',
+         views.comment_list, name='comment_list'),
+    # Поиск по постам
+    path('search/', views.post_search, name='search'),
     # Подписки и отписки
     path('follow/', views.follow_index, name='follow_index'),
     path(
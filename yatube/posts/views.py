@@ -1,79 +1,256 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core import concurrency, streaming
+from core.decorators import query_budget, read_replica, serialize_writes
+
+from . import (
+    author_stats, counters, feed_cache, follow_graph, fragments, search,
+    suggestions, thumbnails, timelines
+)
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Follow
+from .paginators import CountedPaginator, CursorPaginator
 
 AMOUNT_POST = 10
+AMOUNT_COMMENTS = 20
+# Предел SQL-запросов на страницу ленты при QUERY_BUDGET_CHECKS
+FEED_QUERY_BUDGET = 8
+
+
+def prepare_cards(posts, since=None):
+    """Версии кешируемых карточек и готовые миниатюры для постов.
+
+    Кеш версий и хранилище миниатюр опрашиваются одновременно.
+    since — метка fragments.stamp() до чтения строк, по умолчанию
+    момент вызова: ленивый queryset читается уже здесь.
+    Карточка поста, чья миниатюра ещё не готова, не кешируется:
+    иначе в кеше надолго осталась бы исходная картинка.
+    """
+    since = since or fragments.stamp()
+    posts = list(posts)
+    versions = concurrency.defer(fragments.card_versions, posts, since)
+    thumbnails.attach_thumbnails(posts)
+    versions.result()
+    for post in posts:
+        if post.image and post.thumbnail is None:
+            post.card_version = None
+    return posts
+
+
+def page_context(request, posts, keyset=None, counter=None, scope=None):
+    """Паджинатор.
+
+    При keyset=True (по умолчанию — POSTS_KEYSET_PAGINATION) страницы
+    выбираются по курсору (pub_date, id) из параметра ?cursor=.
+    counter — функция, отдающая число записей вместо COUNT(*).
+    Посты страницы готовятся к показу через prepare_cards.
+    scope — имя ленты в feed_cache: страница хранится в кеше до
+    изменения постов ленты (при общем кеше, см. feed_cache.enabled).
+    При POSTS_STREAMING страница не кешируется, а её посты читаются
+    и готовятся пачками при потоковой отдаче (render_feed).
+    """
+    since = fragments.stamp()
+    stream = settings.POSTS_STREAMING
+    if stream or not feed_cache.enabled():
+        scope = None
+    if scope is not None:
+        key = feed_cache.page_key(scope, request)
+        page_obj = feed_cache.load(key, posts, AMOUNT_POST)
+        if page_obj is not None:
+            page_obj.object_list = prepare_cards(
+                page_obj.object_list, since=page_obj.fetched
+            )
+            return page_obj
+    if keyset is None:
+        keyset = settings.POSTS_KEYSET_PAGINATION
+    if keyset:
+        paginator = CursorPaginator(posts, AMOUNT_POST)
+        if stream:
+            return paginator.stream_page(
+                request.GET.get('cursor'), settings.POSTS_STREAM_CHUNK_SIZE
+            )
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        if counter is not None:
+            paginator = CountedPaginator(posts, AMOUNT_POST, counter)
+        else:
+            paginator = Paginator(posts, AMOUNT_POST)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        if stream:
+            return page_obj
+    page_obj.object_list = prepare_cards(page_obj.object_list, since=since)
+    if scope is not None:
+        feed_cache.store(key, page_obj, since)
+    return page_obj
 
 
-def page_context(request, posts):
-    """Паджинатор."""
-    paginator = Paginator(posts, AMOUNT_POST)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def comments_paginator(post):
+    """Паджинатор комментариев поста по курсору (created, id).
 
+    Автор комментария выбирается тем же запросом.
+    """
+    return CursorPaginator(
+        post.comments.select_related('author'), AMOUNT_COMMENTS,
+        key='created', descending=False
+    )
 
-@cache_page(20)
+
+def comments_page(request, post):
+    """Страница комментариев поста."""
+    paginator = comments_paginator(post)
+    cursor = request.GET.get('cursor')
+    if settings.POSTS_STREAMING:
+        return paginator.stream_page(cursor, settings.POSTS_STREAM_CHUNK_SIZE)
+    return paginator.get_page(cursor)
+
+
+def render_feed(request, template, context, **card):
+    """render() для лент; при POSTS_STREAMING карточки идут потоком.
+
+    card — флаги карточки (show_author, show_group, show_edit), те же,
+    что шаблон ленты передаёт в includes/post_card.html.
+    """
+    if not settings.POSTS_STREAMING:
+        return render(request, template, context)
+    return streaming.stream_render(
+        request, template, context, context['page_obj'].object_list,
+        'includes/post_card.html', 'post', item_context=card,
+        prepare=partial(prepare_cards, since=fragments.stamp()),
+        footer_template='posts/includes/paginator.html',
+        chunk_size=settings.POSTS_STREAM_CHUNK_SIZE, separator='<hr>',
+    )
+
+
+def render_comments(request, template, context):
+    """render() для страниц с комментариями; потоком при POSTS_STREAMING."""
+    if not settings.POSTS_STREAMING:
+        return render(request, template, context)
+    return streaming.stream_render(
+        request, template, context, context['comments'].object_list,
+        'posts/includes/comment.html', 'comment',
+        footer_template='posts/includes/more_comments.html',
+        chunk_size=settings.POSTS_STREAM_CHUNK_SIZE,
+    )
+
+
+@read_replica
+@query_budget(FEED_QUERY_BUDGET)
 def index(request):
     """Функция для отображения главной страницы проекта."""
     template = 'posts/index.html'
-    post_list = Post.objects.select_related("group").all()
-    page_obj = page_context(request, post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = page_context(
+        request, post_list, counter=counters.posts_count, scope='index'
+    )
     context = {
         'page_obj': page_obj,
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, context,
+        show_author=True, show_group=True, show_edit=True
+    )
 
 
+@read_replica
+@query_budget(FEED_QUERY_BUDGET)
 def group_posts(request, slug):
     """Функция для отображения страницы сообщества."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    groups_posts = group.posts.select_related('author')
-    page_obj = page_context(request, groups_posts)
+    groups_posts = group.posts.for_feed()
+    page_obj = page_context(
+        request, groups_posts,
+        counter=partial(counters.posts_count, group=group),
+        scope=f'group:{group.pk}'
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
     }
-    return render(request, template, context)
+    return render_feed(request, template, context, show_author=True)
 
 
+@read_replica
+@query_budget(FEED_QUERY_BUDGET)
 def profile(request, username):
     """Функция для отображения профиля пользователя."""
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = page_context(request, post_list)
+    post_list = author.posts.for_feed()
+    stats = concurrency.defer(author_stats.get, author)
+    page_obj = page_context(
+        request, post_list, counter=lambda: stats.result().posts_count
+    )
+    followed = frozenset()
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
+        followed = follow_graph.following(request.user)
     context = {
         'author': author,
-        'following': following,
+        'following': author.pk in followed,
         'page_obj': page_obj,
+        'stats': stats.result(),
+        'suggestions': suggestions.for_user(
+            request.user, exclude=author.pk, followed=followed
+        ),
     }
-    return render(request, template, context)
+    return render_feed(request, template, context)
 
 
+@read_replica
 def post_detail(request, post_id):
     """Функция для отображения конкретной записи."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post.objects.select_related('group'), id=post_id)
-    comments = post.comments.select_related('post')
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
+    stats = concurrency.defer(author_stats.get, post.author)
+    comments = concurrency.defer(comments_page, request, post)
+    thumbnails.attach_thumbnails([post])
     context = {
         'post': post,
         'form': CommentForm(),
-        'comments': comments,
+        'comments': comments.result(),
+        'author_stats': stats.result(),
+    }
+    return render_comments(request, template, context)
+
+
+@read_replica
+def comment_list(request, post_id):
+    """Следующая страница комментариев фрагментом HTML."""
+    template = 'posts/includes/comment_list.html'
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
+    }
+    return render_comments(request, template, context)
+
+
+def post_search(request):
+    """Поиск по текстам постов с ранжированием по релевантности."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = Paginator(search.SearchResults(query), AMOUNT_POST)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_obj.object_list = prepare_cards(page_obj.object_list)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': '&' + urlencode({'q': query}),
     }
     return render(request, template, context)
 
 
+@serialize_writes
 @login_required
 def post_create(request):
     """Функция для создания записи."""
@@ -84,6 +261,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.pregenerate(post)
         return redirect('post:profile', post.author.username)
     context = {
         'post': post,
@@ -93,6 +271,7 @@ def post_create(request):
     return render(request, template, context)
 
 
+@serialize_writes
 @login_required
 def post_edit(request, post_id):
     """Функция для редактирования записи."""
@@ -106,7 +285,9 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
 
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.pregenerate(post)
         return redirect('posts:post_detail', post_id=post_id)
 
     context = {
@@ -117,13 +298,14 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@serialize_writes
 @login_required
 def add_comment(request, post_id):
     """Функция для добавления комментария."""
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
     post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related('post')
+    thumbnails.attach_thumbnails([post])
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -132,24 +314,53 @@ def add_comment(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': comments_page(request, post),
         'form': form,
+        'author_stats': author_stats.get(post.author),
     }
-    return render(request, template, context)
+    return render_comments(request, template, context)
 
 
+def follow_posts(user):
+    """Посты авторов, на которых подписан user: author_id IN (...)
+    по кешу follow_graph, а без него или при большом числе подписок —
+    JOIN подписок."""
+    if follow_graph.enabled():
+        author_ids = follow_graph.following(user)
+        if len(author_ids) <= settings.POSTS_FOLLOW_IN_LIMIT:
+            return Post.objects.for_feed().filter(author_id__in=author_ids)
+    return Post.objects.for_feed().filter(author__following__user=user)
+
+
+@read_replica
+@query_budget(FEED_QUERY_BUDGET)
 @login_required
 def follow_index(request):
     """Подписка на пользователя."""
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = page_context(request, posts)
+    if timelines.enabled():
+        paginator = Paginator(timelines.feed(request.user.id), AMOUNT_POST)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        posts = (
+            Post.objects.for_feed().filter(pk__in=page_obj.object_list)
+            .order_by('-pub_date', '-pk')
+        )
+        if settings.POSTS_STREAMING:
+            page_obj.object_list = posts
+        else:
+            page_obj.object_list = prepare_cards(posts)
+    else:
+        page_obj = page_context(request, follow_posts(request.user))
     context = {
         'page_obj': page_obj,
+        'suggestions': suggestions.for_user(request.user),
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, context, show_author=True, show_group=True
+    )
 
 
+@serialize_writes(all_methods=True)
 @login_required
 def profile_follow(request, username):
     """Функция для подписки на автора."""
@@ -160,6 +371,7 @@ def profile_follow(request, username):
     return redirect('posts:profile', username)
 
 
+@serialize_writes(all_methods=True)
 @login_required
 def profile_unfollow(request, username):
     """Функция для отписки от автора."""
@@ -54,17 +54,93 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# Кеш виден всем воркерам. Только тогда включаются кеши, которые
+# сбрасываются сигналами: страницы лент и подписки пользователей
+CACHE_SHARED = False
+
+# Общий кеш для нескольких воркеров: LRU в памяти процесса (L1)
+# перед файловым кешем в YATUBE_CACHE_DIR (L2), см. core.cache
+if os.environ.get('YATUBE_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {
+                'L2': 'shared',
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 60,
+                'POLL_INTERVAL': 1.0,
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['YATUBE_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+    CACHE_SHARED = True
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Метрики запросов (core.metrics): Server-Timing и /metrics/ для staff.
+# Гистограммы хранятся за последние METRICS_WINDOW секунд
+METRICS_ENABLED = True
+METRICS_WINDOW = 300
+METRICS_WINDOW_SLOTS = 10
+
+# Журнал медленных и повторяющихся запросов (core.querylog) включается
+# путём к файлу в YATUBE_QUERY_LOG. Сводка: python manage.py query_log
+QUERY_LOG_FILE = os.environ.get('YATUBE_QUERY_LOG')
+QUERY_LOG_ENABLED = bool(QUERY_LOG_FILE)
+QUERY_LOG_SLOW_MS = 100
+QUERY_LOG_DUPLICATES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {},
+    'loggers': {},
+}
+if QUERY_LOG_ENABLED:
+    LOGGING['handlers']['query_log'] = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'filename': QUERY_LOG_FILE,
+        'maxBytes': 5 * 1024 * 1024,
+        'backupCount': 5,
+        'encoding': 'utf-8',
+        'delay': True,
+        'formatter': 'message',
+    }
+    LOGGING['loggers']['yatube.queries'] = {
+        'handlers': ['query_log'],
+        'level': 'WARNING',
+        'propagate': False,
+    }
+
+# Выборочное профилирование запросов (core.profiling): каждый N-й запрос
+# в среднем (0 — выключено) и запросы staff с подписанным ?profile=
+PROFILER_SAMPLE_RATE = int(os.environ.get('YATUBE_PROFILE_RATE', 0))
+PROFILER_INTERVAL = 0.005
+PROFILER_TOKEN_MAX_AGE = 24 * 60 * 60
+PROFILER_DIR = os.environ.get(
+    'YATUBE_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+PROFILER_KEEP = 200
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
@@ -92,6 +168,51 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Курсорная паджинация лент вместо OFFSET (posts.paginators)
+POSTS_KEYSET_PAGINATION = False
+# Подсчёт записей для паджинации: exact, counter или estimated
+POSTS_COUNT_MODE = 'counter'
+# Ленты подписок, собираемые при публикации (posts.timelines, только
+# при CACHE_SHARED)
+POSTS_TIMELINES = False
+POSTS_TIMELINE_LENGTH = 800
+POSTS_TIMELINE_FANOUT_LIMIT = 10000
+POSTS_TIMELINE_TIMEOUT = 60 * 60 * 24
+# Подписки пользователя в кеше (posts.follow_graph, только при
+# CACHE_SHARED); лента подписок строится через author_id IN (...),
+# пока авторов не больше лимита
+POSTS_FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+POSTS_FOLLOW_IN_LIMIT = 500
+# Рекомендации «на кого подписаться» (posts.suggestions); пересчитывает
+# python manage.py follow_suggestions --loop по очереди изменений.
+# Без запросов к БД они отдаются только при CACHE_SHARED, иначе это
+# один запрос на страницу
+POSTS_SUGGESTIONS = 5
+POSTS_SUGGESTIONS_TIMEOUT = 60 * 60 * 24 * 7
+POSTS_SUGGESTION_FANOUT_LIMIT = 1000
+# Время жизни страниц лент (только при CACHE_SHARED); сбрасываются
+# изменением постов, их групп и авторов
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60
+# Потоковая отдача лент и комментариев (core.streaming); строки
+# читаются из БД и рендерятся пачками по POSTS_STREAM_CHUNK_SIZE
+POSTS_STREAMING = False
+POSTS_STREAM_CHUNK_SIZE = 100
+# Индекс поиска (posts.search): 'auto' — FTS5 на SQLite, где он есть,
+# иначе таблица SearchTerm; 'fts5' или 'python' — выбрать явно
+POSTS_SEARCH_BACKEND = 'auto'
+# Потоки для независимых запросов представлений (core.concurrency);
+# 0 — запросы выполняются по очереди в потоке запроса
+CONCURRENT_QUERY_WORKERS = int(
+    os.environ.get('YATUBE_QUERY_WORKERS', 0)
+)
+# Проверка бюджета SQL-запросов лент (core.decorators.query_budget)
+QUERY_BUDGET_CHECKS = False
+# Шаблоны читают только готовые миниатюры; недостающие создаются
+# пулом из YATUBE_THUMBNAIL_WORKERS потоков (0 — сразу, в запросе)
+THUMBNAIL_BACKEND = 'posts.thumbnails.PrecomputedThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BatchKVStore'
+POSTS_THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 0))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -105,6 +226,42 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения лент (core.routers): YATUBE_REPLICAS — пути
+# к копиям БД SQLite через запятую
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_REPLICAS', '').split(','))
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Настройки SQLite (core.sqlite). Профиль YATUBE_SQLITE_PROFILE=production
+# включает WAL, постоянные соединения и очередь писателей
+SQLITE_PRAGMAS = {}
+SQLITE_SERIALIZE_WRITES = False
+SQLITE_WRITE_RETRIES = 3
+if os.environ.get('YATUBE_SQLITE_PROFILE') == 'production':
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['OPTIONS'] = {'timeout': 20}
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'busy_timeout': 20000,
+        'temp_store': 'memory',
+    }
+    SQLITE_SERIALIZE_WRITES = True
+# Сколько секунд после записи пользователь читает из default
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators